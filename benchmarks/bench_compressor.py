@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compressor Benchmark
+Runs the NumPy compressor block by block over synthetic 44.1 kHz stereo audio
+and reports how long it takes relative to real time
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# Add the source tree to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.dynamics import Compressor
+
+
+def make_blocks(sample_rate: int, channels: int, block_frames: int, count: int = 6) -> list:
+    """Speech-like test blocks: noise under a slow syllable-rate envelope with loud bursts"""
+    rng = np.random.default_rng(1234)
+    blocks = []
+    for index in range(count):
+        t = (np.arange(block_frames) + index * block_frames) / sample_rate
+        envelope = 0.05 + 0.45 * np.abs(np.sin(2 * np.pi * 3.0 * t)) * (1 + (np.sin(2 * np.pi * 0.2 * t) > 0.8))
+        noise = rng.standard_normal((block_frames, channels))
+        blocks.append((noise * envelope[:, np.newaxis] * 0.3).astype(np.float32))
+    return blocks
+
+
+def run_benchmark(minutes: float, sample_rate: int, channels: int, block_seconds: float, detector: str) -> dict:
+    """Compress minutes of audio and return timing figures"""
+    block_frames = int(block_seconds * sample_rate)
+    blocks = make_blocks(sample_rate, channels, block_frames)
+    total_blocks = int(np.ceil(minutes * 60 / block_seconds))
+    compressor = Compressor(sample_rate, threshold=-20.0, ratio=4.0, detector=detector)
+    output = np.empty_like(blocks[0])
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    for index in range(total_blocks):
+        compressor.process(blocks[index % len(blocks)], out=output)
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+
+    audio_seconds = total_blocks * block_seconds
+    return {
+        'audio_seconds': audio_seconds,
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': cpu_seconds,
+        'realtime_factor': cpu_seconds / audio_seconds,
+        'speed': audio_seconds / cpu_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the block compressor')
+    parser.add_argument('--minutes', type=float, default=60.0, help='Minutes of audio to process')
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--block-seconds', type=float, default=10.0)
+    parser.add_argument('--detector', choices=['rms', 'peak'], default='rms')
+    parser.add_argument('--max-realtime-factor', type=float, default=None,
+                        help='Exit non-zero if CPU time / audio time exceeds this')
+    args = parser.parse_args()
+
+    result = run_benchmark(args.minutes, args.sample_rate, args.channels, args.block_seconds, args.detector)
+
+    print(f"Compressed {result['audio_seconds'] / 60:.1f} min of {args.sample_rate} Hz, "
+          f"{args.channels}-channel audio ({args.detector} detector)")
+    print(f"  wall time:        {result['wall_seconds']:.2f} s")
+    print(f"  CPU time:         {result['cpu_seconds']:.2f} s")
+    print(f"  real-time factor: {result['realtime_factor']:.4f} ({result['speed']:.0f}x real time)")
+
+    if args.max_realtime_factor is not None and result['realtime_factor'] > args.max_realtime_factor:
+        print(f"FAIL: real-time factor above {args.max_realtime_factor}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Processor Benchmark
+Times AdvancedAudioProcessor's decode, mix, render and export stages on
+synthetic segments and music, and writes wall time, CPU time and peak RSS to a JSON report
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+# Add the source tree to the Python path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from core.advanced_audio_processor import AdvancedAudioProcessor
+
+STAGES = ('load_audio_file', 'mix_audio_layers', 'process_template_segments', 'export')
+
+
+def write_source(path: str, seconds: float, sample_rate: int, channels: int, seed: int, kind: str) -> None:
+    """Write a synthetic source: speech-like modulated noise, or a chord for music"""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * sample_rate)
+    t = np.arange(frames) / sample_rate
+    if kind == 'music':
+        mono = sum(np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6)) * 0.1
+        samples = np.repeat(mono[:, np.newaxis], channels, axis=1)
+    else:
+        envelope = 0.05 + 0.45 * np.abs(np.sin(2 * np.pi * 3.0 * t))
+        samples = rng.standard_normal((frames, channels)) * envelope[:, np.newaxis] * 0.2
+    sf.write(path, samples.astype(np.float32), sample_rate)
+
+
+def make_fixture(directory: str, args) -> dict:
+    """Create the benchmark's segment and music files"""
+    extension = args.format
+    segments = []
+    for index in range(args.segments):
+        path = os.path.join(directory, f'segment_{index}.{extension}')
+        write_source(path, args.segment_seconds, args.sample_rate, args.channels, index, 'speech')
+        segments.append({
+            'audio_file': path,
+            'type': 'main',
+            'timing': {'start_offset': 0.5, 'end_offset': 0.5},
+            'fade': {'fade_in': 1.0, 'fade_out': 1.0}
+        })
+
+    music = os.path.join(directory, f'music.{extension}')
+    write_source(music, args.music_seconds, args.music_sample_rate, args.channels, 999, 'music')
+    return {
+        'segments': segments,
+        'music_track': {'type': 'upload', 'file_path': music, 'fade_in': 2, 'fade_out': 3},
+        'output_dir': os.path.join(directory, 'outputs')
+    }
+
+
+def make_processor(fixture: dict, options: dict) -> AdvancedAudioProcessor:
+    """Processor without shared caches, so every run does the full work"""
+    return AdvancedAudioProcessor(
+        output_dir=fixture['output_dir'],
+        streaming=options['streaming'],
+        block_seconds=options['block_seconds'],
+        decode_workers=options['decode_workers']
+    )
+
+
+def stage_load(processor, fixture):
+    """Decode every source"""
+    for segment in fixture['segments']:
+        processor.load_audio_file(segment['audio_file'])
+    processor.load_audio_file(fixture['music_track']['file_path'])
+
+
+def stage_mix(processor, fixture):
+    """Mix the segments back to back over the music bed"""
+    layers = []
+    start = 0.0
+    for segment in fixture['segments']:
+        layers.append({'audio': segment['audio_file'], 'start_time': start, 'fade_in': 1.0, 'fade_out': 1.0})
+        start += processor.get_audio_duration(segment['audio_file'])
+    layers.append({'audio': fixture['music_track']['file_path'], 'start_time': 0.0, 'volume': -10})
+    mixed = processor.mix_audio_layers(layers)
+    # mix_audio_layers reports errors by returning a second of silence
+    if len(mixed) < int(start * 1000) - 1:
+        raise RuntimeError(f"mix_audio_layers returned {len(mixed)} ms, expected {start * 1000:.0f} ms")
+
+
+def stage_render(processor, fixture):
+    """Render the fixture as a template episode"""
+    result = processor.process_template_segments(
+        fixture['segments'], fixture['music_track'], 'bench_render.mp3'
+    )
+    if not result.get('success'):
+        raise RuntimeError(result.get('error'))
+
+
+def stage_export(processor, fixture, samples, sample_rate):
+    """Encode a prepared buffer to the configured outputs"""
+    output = os.path.join(fixture['output_dir'], 'bench_export.mp3')
+    processor.export_samples(samples, sample_rate, processor.plan_outputs(output))
+
+
+def cpu_seconds(who: int) -> float:
+    """User plus system CPU time from getrusage"""
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_stage(stage: str, fixture: dict, options: dict) -> dict:
+    """Run one stage in this (fresh) process and measure it"""
+    processor = make_processor(fixture, options)
+    arguments = ()
+    if stage == 'export':
+        # The buffer to export is prepared before measuring
+        sample_rate, channels = options['sample_rate'], options['channels']
+        frames = int(options['export_seconds'] * sample_rate)
+        rng = np.random.default_rng(0)
+        samples = (rng.standard_normal((frames, channels)) * 0.1).astype(np.float32)
+        arguments = (samples, sample_rate)
+    function = {
+        'load_audio_file': stage_load,
+        'mix_audio_layers': stage_mix,
+        'process_template_segments': stage_render,
+        'export': stage_export
+    }[stage]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu_start = cpu_seconds(resource.RUSAGE_SELF)
+    children_start = cpu_seconds(resource.RUSAGE_CHILDREN)
+    wall_start = time.perf_counter()
+    function(processor, fixture, *arguments)
+    wall = time.perf_counter() - wall_start
+
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        'wall_seconds': wall,
+        'cpu_seconds': cpu_seconds(resource.RUSAGE_SELF) - cpu_start,
+        'child_cpu_seconds': cpu_seconds(resource.RUSAGE_CHILDREN) - children_start,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'setup_rss_mb': rss_before / 1024,
+        'child_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def measure(stage: str, fixture: dict, options: dict, repeat: int) -> dict:
+    """Run a stage repeat times, each in a new process so peak RSS is its own"""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            runs.append(pool.submit(run_stage, stage, fixture, options).result())
+
+    summary = {'runs': runs}
+    for key in runs[0]:
+        summary[key] = statistics.median(run[key] for run in runs)
+    summary['min_wall_seconds'] = min(run['wall_seconds'] for run in runs)
+    return summary
+
+
+def git_revision() -> str:
+    """Short hash of the checked-out commit"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(report: dict, baseline: dict) -> None:
+    """Print each stage's median wall time against a baseline report"""
+    print(f"Compared with {baseline.get('revision', 'baseline')}:")
+    for stage, result in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        change = (result['wall_seconds'] / previous['wall_seconds'] - 1.0) * 100
+        print(f"  {stage:<27} {previous['wall_seconds']:8.3f} s -> {result['wall_seconds']:8.3f} s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AdvancedAudioProcessor stages')
+    parser.add_argument('--segments', type=int, default=4, help='Number of episode segments')
+    parser.add_argument('--segment-seconds', type=float, default=120.0)
+    parser.add_argument('--music-seconds', type=float, default=60.0)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--music-sample-rate', type=int, default=48000)
+    parser.add_argument('--channels', type=int, default=2)
+    parser.add_argument('--format', choices=['wav', 'flac'], default='wav', help='Fixture file format')
+    parser.add_argument('--export-seconds', type=float, default=300.0, help='Length of the exported buffer')
+    parser.add_argument('--streaming', action='store_true', help='Use the streaming renderer')
+    parser.add_argument('--block-seconds', type=float, default=10.0)
+    parser.add_argument('--decode-workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; medians are reported')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--output', default='benchmark_report.json', help='JSON report path')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against')
+    args = parser.parse_args()
+
+    options = {
+        'streaming': args.streaming,
+        'block_seconds': args.block_seconds,
+        'decode_workers': args.decode_workers,
+        'sample_rate': args.sample_rate,
+        'channels': args.channels,
+        'export_seconds': args.export_seconds
+    }
+
+    with tempfile.TemporaryDirectory(prefix='bench_processor_') as directory:
+        fixture = make_fixture(directory, args)
+        report = {
+            'revision': git_revision(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'machine': {
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpu_count': os.cpu_count(),
+                'python': platform.python_version(),
+                'numpy': np.__version__
+            },
+            'parameters': vars(args),
+            'stages': {}
+        }
+        for stage in args.stages:
+            result = measure(stage, fixture, options, args.repeat)
+            report['stages'][stage] = result
+            print(f"{stage:<27} wall {result['wall_seconds']:8.3f} s  cpu {result['cpu_seconds']:8.3f} s"
+                  f"  ffmpeg cpu {result['child_cpu_seconds']:7.3f} s  peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            compare(report, json.load(handle))
+
+
+if __name__ == '__main__':
+    main()
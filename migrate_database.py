@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Database Migration Script
-Adds new API key and voice settings columns to User table
+Adds new API key and voice settings columns to User table, and render
+result columns to Episode table
 """
 
 import os
@@ -55,6 +56,22 @@ def migrate_database():
             else:
                 print(f"⏭️  Column already exists: {column_name}")
         
+        # Episode render results, kept out of the client-editable episode_metadata
+        existing_episode_columns = [col['name'] for col in inspector.get_columns('episodes')]
+        episode_columns = [
+            ('renditions', 'JSON'),
+            ('chapters', 'JSON')
+        ]
+        
+        for column_name, column_type in episode_columns:
+            if column_name not in existing_episode_columns:
+                print(f"➕ Adding column: episodes.{column_name}")
+                session.execute(text(f"ALTER TABLE episodes ADD COLUMN {column_name} {column_type}"))
+                session.commit()
+                print(f"✅ Added column: episodes.{column_name}")
+            else:
+                print(f"⏭️  Column already exists: episodes.{column_name}")
+        
         # Rename old columns if they exist
         old_to_new = {
             'elevenlabs_key': 'elevenlabs_api_key',
@@ -3,6 +3,7 @@ Episodes API Blueprint
 Handles episode creation, management, and processing
 """
 
+import os
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
@@ -11,12 +12,73 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from database import get_db_session
 from database.models_dev import Episode, Podcast, Template, Job, UserFile, User, File
-from core.tasks import process_episode_task
+from api.files import peaks_response
+from core.render_plan import TemplateError, compile_template
+from core.tagging import episode_tags, write_tags
+from core.waveform import peaks_path
+from core.tasks import process_episode_batch_task, process_episode_task
 # Removed 'from api.app import celery' to fix circular import
 
 episodes_bp = Blueprint('episodes', __name__)
 
 
+# Episode fields that are written into the rendered files' tags
+TAGGED_FIELDS = ('title', 'description', 'episode_number', 'season_number')
+
+
+def rendered_files(episode):
+    """Paths of every file the render task wrote for an episode"""
+    paths = [output['path'] for output in episode.renditions or [] if output.get('path')]
+    if episode.output_file and episode.output_file not in paths:
+        paths.append(episode.output_file)
+    return paths
+
+
+def retag_episode(episode):
+    """Rewrite the tags of an episode's rendered files in place after a metadata edit"""
+    tags = episode_tags(episode, episode.podcast, upload_folder=current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    retagged = 0
+    for path in rendered_files(episode):
+        if not os.path.exists(path):
+            continue
+        try:
+            write_tags(path, tags)
+            retagged += 1
+        except Exception as e:
+            current_app.logger.warning(f"Retagging {path} failed: {str(e)}")
+    return retagged
+
+
+def resolve_audio_files(db, episode, user_id):
+    """
+    Paths of an episode's uploaded audio files
+
+    Returns:
+        (paths, None), or (None, error response) if a file is missing
+    """
+    upload_path = Path(current_app.config.get('UPLOAD_FOLDER', 'uploads'))
+    audio_files = []
+    for file_id in episode.audio_files:
+        # Try UserFile first (legacy), then the File table (new)
+        file = db.query(UserFile).filter_by(
+            id=file_id,
+            user_id=user_id,
+            file_type='audio'
+        ).first() or db.query(File).filter_by(
+            id=file_id,
+            user_id=user_id
+        ).first()
+        if not file:
+            print(f"[DEBUG] resolve_audio_files: Audio file {file_id} not found in UserFile or File table")
+            return None, ({'error': f'Audio file {file_id} not found'}, 404)
+        file_path = upload_path / file.file_path
+        if not file_path.exists():
+            print(f"[DEBUG] resolve_audio_files: Audio file {file_id} not found on disk")
+            return None, ({'error': f'Audio file {file_id} not found on disk'}, 404)
+        audio_files.append(str(file_path))
+    return audio_files, None
+
+
 @episodes_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_episodes():
@@ -175,6 +237,10 @@ def update_episode(episode_id):
         episode.updated_at = datetime.now(timezone.utc)
         db.commit()
 
+        # Rendered files only need their tag headers rewritten, not a new render
+        if episode.output_file and any(field in data for field in TAGGED_FIELDS):
+            retag_episode(episode)
+
         return {
             'message': 'Episode updated successfully',
             'episode': episode.to_dict()
@@ -237,39 +303,17 @@ def process_episode(episode_id):
             if not template:
                 print(f"[DEBUG] process_episode: Template not found: {episode.template_id}")
                 return {'error': 'Template not found'}, 404
+            # Reject templates that cannot render before a worker picks them up
+            try:
+                compile_template(template)
+            except TemplateError as e:
+                print(f"[DEBUG] process_episode: Invalid template {episode.template_id}: {e}")
+                return {'error': f'Invalid template: {e}'}, 400
 
         # Validate audio files exist
-        audio_files = []
-        for file_id in episode.audio_files:
-            # Try UserFile first (legacy)
-            user_file = db.query(UserFile).filter_by(
-                id=file_id,
-                user_id=user_id,
-                file_type='audio'
-            ).first()
-            if user_file:
-                upload_path = Path(current_app.config.get('UPLOAD_FOLDER', 'uploads'))
-                file_path = upload_path / user_file.file_path
-                if not file_path.exists():
-                    print(f"[DEBUG] process_episode: Audio file {file_id} not found on disk (UserFile)")
-                    return {'error': f'Audio file {file_id} not found on disk'}, 404
-                audio_files.append(str(file_path))
-                continue
-            # Try File table (new)
-            file = db.query(File).filter_by(
-                id=file_id,
-                user_id=user_id
-            ).first()
-            if file:
-                upload_path = Path(current_app.config.get('UPLOAD_FOLDER', 'uploads'))
-                file_path = upload_path / file.file_path
-                if not file_path.exists():
-                    print(f"[DEBUG] process_episode: Audio file {file_id} not found on disk (File)")
-                    return {'error': f'Audio file {file_id} not found on disk'}, 404
-                audio_files.append(str(file_path))
-                continue
-            print(f"[DEBUG] process_episode: Audio file {file_id} not found in UserFile or File table")
-            return {'error': f'Audio file {file_id} not found'}, 404
+        audio_files, error = resolve_audio_files(db, episode, user_id)
+        if error:
+            return error
 
         print(f"[DEBUG] process_episode: audio_files list: {audio_files}")
         if not audio_files:
@@ -339,6 +383,108 @@ def process_episode(episode_id):
         return {'error': f'Failed to start processing: {str(e)}'}, 500
 
 
+@episodes_bp.route('process-batch', methods=['POST'])
+@jwt_required()
+def process_episode_batch():
+    """Queue episodes that share a template as one batch render (e.g. a backlog import)"""
+    try:
+        user_id = get_jwt_identity()
+        db = get_db_session()
+        data = request.get_json() or {}
+
+        episode_ids = data.get('episode_ids')
+        if not isinstance(episode_ids, list) or not episode_ids:
+            return {'error': 'episode_ids must be a non-empty list'}, 400
+        episode_ids = list(dict.fromkeys(episode_ids))
+
+        # Get episodes with ownership check
+        found = {
+            episode.id: episode
+            for episode in db.query(Episode).join(Podcast).filter(
+                Episode.id.in_(episode_ids),
+                Podcast.user_id == user_id
+            ).all()
+        }
+        missing = [episode_id for episode_id in episode_ids if episode_id not in found]
+        if missing:
+            return {'error': f"Episodes not found: {', '.join(map(str, missing))}"}, 404
+        episodes = [found[episode_id] for episode_id in episode_ids]
+
+        processing = [episode.id for episode in episodes if episode.status == 'processing']
+        if processing:
+            return {'error': f"Episodes already being processed: {', '.join(map(str, processing))}"}, 400
+
+        # One template per batch, so its assets are decoded once for every episode
+        template_ids = {episode.template_id for episode in episodes}
+        if len(template_ids) != 1 or None in template_ids:
+            return {'error': 'All episodes in a batch must use the same template'}, 400
+        template = db.query(Template).filter_by(id=template_ids.pop(), user_id=user_id).first()
+        if not template:
+            return {'error': 'Template not found'}, 404
+        try:
+            compile_template(template)
+        except TemplateError as e:
+            return {'error': f'Invalid template: {e}'}, 400
+
+        jobs = []
+        for episode in episodes:
+            audio_files, error = resolve_audio_files(db, episode, user_id)
+            if error:
+                return error
+            if not audio_files:
+                return {'error': f'No valid audio files found for episode {episode.id}'}, 400
+
+            job = Job(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                episode_id=episode.id,
+                job_type='episode_processing',
+                status='queued',
+                input_data={
+                    'episode_id': episode.id,
+                    'audio_files': audio_files,
+                    'template_id': episode.template_id,
+                    'options': data.get('options', {}),
+                    'batch_size': len(episodes)
+                }
+            )
+            db.add(job)
+            jobs.append(job)
+
+            episode.status = 'processing'
+            episode.updated_at = datetime.now(timezone.utc)
+
+        db.commit()
+
+        # Start one background task for the whole batch
+        try:
+            task = process_episode_batch_task.apply_async(
+                args=[[[job.episode_id, job.id] for job in jobs], user_id],
+                queue='episode_processing'
+            )
+            for job in jobs:
+                job.task_id = task.id
+            db.commit()
+        except Exception as queue_error:
+            for job, episode in zip(jobs, episodes):
+                job.status = 'failed'
+                job.error_message = f"Failed to start processing: {str(queue_error)}"
+                job.completed_at = datetime.now(timezone.utc)
+                episode.status = 'failed'
+                episode.updated_at = datetime.now(timezone.utc)
+            db.commit()
+            return {'error': f'Failed to start processing: {str(queue_error)}'}, 500
+
+        return {
+            'message': 'Batch processing started',
+            'task_id': task.id,
+            'jobs': [{'episode_id': job.episode_id, 'job_id': job.id} for job in jobs]
+        }
+
+    except Exception as e:
+        return {'error': f'Failed to start batch processing: {str(e)}'}, 500
+
+
 @episodes_bp.route('<episode_id>/download', methods=['GET'])
 @jwt_required()
 def download_episode(episode_id):
@@ -376,6 +522,33 @@ def download_episode(episode_id):
         return {'error': 'Failed to download episode'}, 500
 
 
+@episodes_bp.route('<episode_id>/peaks', methods=['GET'])
+@jwt_required()
+def get_episode_peaks(episode_id):
+    """Get waveform peaks for the processed episode"""
+    try:
+        user_id = get_jwt_identity()
+        db = get_db_session()
+
+        # Get episode with ownership check
+        episode = db.query(Episode).join(Podcast).filter(
+            Episode.id == episode_id,
+            Podcast.user_id == user_id
+        ).first()
+
+        if not episode:
+            return {'error': 'Episode not found'}, 404
+
+        if episode.status != 'completed' or not episode.output_file:
+            return {'error': 'Episode not processed yet'}, 400
+
+        return peaks_response(episode.output_file)
+
+    except Exception as e:
+        current_app.logger.error(f"Episode peaks error: {str(e)}")
+        return {'error': 'Failed to load waveform'}, 500
+
+
 @episodes_bp.route('<episode_id>', methods=['DELETE'])
 @jwt_required()
 def delete_episode(episode_id):
@@ -393,11 +566,11 @@ def delete_episode(episode_id):
         if not episode:
             return {'error': 'Episode not found'}, 404
 
-        # Delete output file if it exists
-        if episode.output_file:
-            output_file = Path(episode.output_file)
-            if output_file.exists():
-                output_file.unlink()
+        # Delete every rendered file and its waveform peaks
+        for path in rendered_files(episode):
+            for rendered in (Path(path), Path(peaks_path(path))):
+                if rendered.exists():
+                    rendered.unlink()
 
         # Delete related jobs
         db.query(Job).filter_by(episode_id=episode_id).delete()
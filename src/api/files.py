@@ -10,7 +10,6 @@ from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
-import librosa
 import soundfile as sf
 import json
 import shutil
@@ -19,6 +18,8 @@ from datetime import datetime
 from database import get_db_session
 from database.models_dev import UserFile, User
 from database.models import File
+from core.audio_probe import probe_audio
+from core.waveform import PEAKS_SUFFIX, peaks_path, read_peaks
 from database import get_db_session
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from database import get_db_session
@@ -52,17 +53,54 @@ def allowed_file(filename, file_type=None):
 
 
 def get_audio_duration(file_path):
-    """Get audio file duration using librosa"""
+    """Get audio file duration from its container headers"""
     try:
-        # Load audio file
-        y, sr = librosa.load(file_path, sr=None)
-        duration = librosa.get_duration(y=y, sr=sr)
-        return round(duration, 2)
+        info = probe_audio(file_path)
+        if not info:
+            return None
+        return round(info['duration'], 2)
     except Exception as e:
         current_app.logger.error(f"Error getting audio duration: {str(e)}")
         return None
 
 
+def queue_waveform(file_path):
+    """Queue peak generation for an audio file; uploads succeed even if the queue is down"""
+    try:
+        from core.tasks import generate_waveform_task
+        generate_waveform_task.delay(str(file_path))
+    except Exception as e:
+        current_app.logger.warning(f"Could not queue waveform for {file_path}: {str(e)}")
+
+
+def peaks_response(audio_path):
+    """
+    Waveform peaks for an audio file as a JSON response, limited to the range
+    in the start/end (seconds), samples_per_pixel and level query arguments
+    """
+    path = peaks_path(str(audio_path))
+    if not os.path.exists(path):
+        return {'error': 'Waveform not available yet'}, 404
+
+    try:
+        end = request.args.get('end', type=float)
+        samples_per_pixel = request.args.get('samples_per_pixel', type=int)
+        level = request.args.get('level', type=int)
+        result = read_peaks(
+            path,
+            start=request.args.get('start', 0.0, type=float),
+            end=end,
+            samples_per_pixel=samples_per_pixel,
+            level=level
+        )
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    # Interleaved min, max pairs scaled to +/-127
+    result['peaks'] = result['peaks'].ravel().tolist()
+    return result
+
+
 def get_file_info(file_path):
     """Get detailed file information including audio metadata"""
     try:
@@ -81,12 +119,13 @@ def get_file_info(file_path):
         
         if file_ext in audio_extensions:
             try:
-                y, sr = librosa.load(file_path, sr=None)
-                duration = librosa.get_duration(y=y, sr=sr)
+                info = probe_audio(file_path)
+                if not info:
+                    raise ValueError('Unreadable audio stream')
                 file_info.update({
-                    'duration': round(duration, 2),
-                    'sample_rate': sr,
-                    'channels': y.shape[1] if len(y.shape) > 1 else 1,
+                    'duration': round(info['duration'], 2),
+                    'sample_rate': info['sample_rate'],
+                    'channels': info['channels'],
                     'audio_type': 'audio'
                 })
             except Exception as e:
@@ -143,8 +182,14 @@ def upload_file():
         
         # Get file metadata
         duration = None
+        sample_rate = None
+        channels = None
         if file_extension in ALLOWED_AUDIO_EXTENSIONS:
-            duration = get_audio_duration(file_path)
+            audio_info = probe_audio(str(file_path))
+            if audio_info:
+                duration = round(audio_info['duration'], 2)
+                sample_rate = audio_info['sample_rate']
+                channels = audio_info['channels']
         
         # Get form data
         category = request.form.get('category', 'uncategorized')
@@ -166,11 +211,16 @@ def upload_file():
                 category=category,
                 file_size=file_size,
                 mime_type=file.content_type,
-                duration=duration
+                duration=duration,
+                sample_rate=sample_rate,
+                channels=channels
             )
             
             db.add(db_file)
             db.commit()
+            
+            if file_extension in ALLOWED_AUDIO_EXTENSIONS:
+                queue_waveform(file_path)
         
             return {
                 'message': 'File uploaded successfully',
@@ -179,6 +229,8 @@ def upload_file():
                     'name': filename,
                     'size': file_size,
                     'duration': duration,
+                    'sample_rate': sample_rate,
+                    'channels': channels,
                     'type': 'audio' if file_extension in ALLOWED_AUDIO_EXTENSIONS else 'image',
                     'category': category,
                     'description': description
@@ -263,6 +315,7 @@ def upload_audio_files():
                 
                 db.add(user_file)
                 db.commit()
+                queue_waveform(file_path)
                 
                 uploaded_files.append({
                     'id': str(user_file.id),
@@ -318,6 +371,31 @@ def get_file(file_id):
         db.close()
 
 
+@files_bp.route('/<file_id>/peaks', methods=['GET'])
+@jwt_required()
+def get_file_peaks(file_id):
+    """Get waveform peaks for an uploaded audio file"""
+    db = get_db_session()
+    try:
+        user_id = get_jwt_identity()
+        # Audio uploads are stored as UserFile rows, older uploads as File rows
+        db_file = db.query(UserFile).filter(
+            UserFile.id == file_id,
+            UserFile.user_id == user_id
+        ).first() or db.query(File).filter(
+            File.id == file_id,
+            File.user_id == user_id
+        ).first()
+        if not db_file:
+            return {'error': 'File not found'}, 404
+        return peaks_response(Path(current_app.config['UPLOAD_FOLDER']) / db_file.file_path)
+    except Exception as e:
+        current_app.logger.error(f"Waveform peaks error: {str(e)}")
+        return {'error': 'Failed to load waveform'}, 500
+    finally:
+        db.close()
+
+
 @files_bp.route('/', methods=['GET'])
 @jwt_required()
 def list_files():
@@ -348,6 +426,9 @@ def list_files():
         
         for root, dirs, filenames in os.walk(user_upload_dir):
             for filename in filenames:
+                # Waveform peaks belong to the audio file beside them
+                if filename.endswith(PEAKS_SUFFIX):
+                    continue
                 file_path = os.path.join(root, filename)
                 relative_path = os.path.relpath(file_path, upload_folder)
                 
@@ -486,8 +567,10 @@ def delete_file_by_path(file_path):
             session.delete(db_file)
             session.commit()
         
-        # Delete file
+        # Delete file and its waveform peaks
         os.remove(full_path)
+        if os.path.exists(peaks_path(full_path)):
+            os.remove(peaks_path(full_path))
         
         # Clean up empty directories
         directory = os.path.dirname(full_path)
@@ -561,8 +644,10 @@ def bulk_delete_files():
                 if db_file:
                     session.delete(db_file)
                 
-                # Delete file
+                # Delete file and its waveform peaks
                 os.remove(full_path)
+                if os.path.exists(peaks_path(full_path)):
+                    os.remove(peaks_path(full_path))
                 deleted_files.append({
                     'path': file_path,
                     'size_mb': round(file_size / (1024 * 1024), 2)
@@ -4,147 +4,540 @@ Handles sophisticated audio processing for podcast templates with precise timing
 """
 
 import os
-import librosa
+import multiprocessing
 import soundfile as sf
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 from pydub import AudioSegment
 
+from .audio_handle import AudioHandle, AudioSources, decode_window
+from .audio_probe import probe_audio
+from .audio_mixer import (
+    SAMPLE_DTYPES, AudioMixer, LoopedSource, pcm_to_samples, samples_to_segment, segment_to_samples
+)
+from .audio_stream import StreamingRenderer, decode_to_array, open_encoder, slice_window
+from .dynamics import Compressor
+from .encoder_pool import EncoderPool
+from .fades import apply_fades, fade_gains
+from .instrumentation import Instrumentation
+from .loudness import normalize_loudness
+from .pcm_buffer import ScratchSpace
+from .pcm_cache import DecodedAssets, PcmCache
+from .resample import render_format, to_render_format
+from .render_plan import RenderPlan, TemplateError, compile_structure
+from .silence import analyze_file, find_keep_ranges, trim_settings
+from .tagging import chapter_title, write_tags
+
+# Sources up to this decoded size (about 6 minutes of 48 kHz stereo) are
+# decoded whole into the shared caches: intros, outros, stingers and beds
+# recur across episodes, while long recordings are decoded only in the
+# window a segment keeps
+SHARED_SOURCE_MAX_BYTES = 64 * 1024 * 1024
+
+# Default rendition: a single 192k MP3 written to the requested output file
+DEFAULT_OUTPUT_PROFILES = [
+    {'name': 'mp3', 'format': 'mp3', 'bitrate': '192k', 'extension': 'mp3'}
+]
+
+# Published renditions, all encoded in parallel from one mix pass
+PUBLISH_OUTPUT_PROFILES = [
+    {'name': 'mp3', 'format': 'mp3', 'bitrate': '192k', 'extension': 'mp3'},
+    {'name': 'mp3_64k_mono', 'format': 'mp3', 'bitrate': '64k', 'channels': 1, 'extension': 'mp3'},
+    {'name': 'opus', 'format': 'opus', 'codec': 'libopus', 'bitrate': '64k', 'extension': 'opus'}
+]
+
 class AdvancedAudioProcessor:
     """Advanced audio processing for podcast templates"""
     
-    def __init__(self, output_dir: str = "outputs"):
+    def __init__(self,
+                 output_dir: str = "outputs",
+                 streaming: bool = False,
+                 block_seconds: float = 10.0,
+                 pcm_cache: Optional[PcmCache] = None,
+                 use_memmap: bool = False,
+                 scratch_dir: Optional[str] = None,
+                 decode_workers: int = 4,
+                 decode_executor: str = 'thread',
+                 loudness_target: Optional[float] = None,
+                 true_peak_limit: Optional[float] = -1.0,
+                 encoder_pool: Optional[EncoderPool] = None,
+                 output_profiles: Optional[List[Dict]] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 decoded_assets: Optional[DecodedAssets] = None):
+        """
+        Args:
+            output_dir: Directory for rendered episodes
+            streaming: Render in fixed-size blocks with bounded memory instead of in memory
+            block_seconds: Block length used by streaming renders
+            pcm_cache: Shared decoded-PCM cache for recurring assets (optional)
+            use_memmap: Back segment buffers and the mix bus with memmap files
+            scratch_dir: Directory for memmap files (defaults to the system temp directory)
+            decode_workers: Number of sources decoded concurrently
+            decode_executor: 'thread' or 'process' pool for the decode stage; daemon
+                processes (e.g. Celery prefork workers) cannot start children,
+                so they always decode in threads
+            loudness_target: Integrated loudness (LUFS) rendered episodes are normalized to
+            true_peak_limit: True-peak ceiling (dBTP) applied when normalizing
+            encoder_pool: Warm ffmpeg encoders shared by this worker (optional)
+            output_profiles: Renditions to encode from each mix (defaults to one 192k MP3);
+                the first is written to the requested output file
+            instrumentation: Collects per-stage timing spans (a private one by default)
+            decoded_assets: In-memory shared assets reused by every render of a batch (optional)
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.streaming = streaming
+        self.block_seconds = block_seconds
+        self.pcm_cache = pcm_cache
+        self.use_memmap = use_memmap
+        self.scratch_dir = scratch_dir
+        self.decode_workers = max(1, int(decode_workers))
+        if decode_executor == 'process' and multiprocessing.current_process().daemon:
+            print("Decode processes cannot be started from a daemon process; decoding in threads")
+            decode_executor = 'thread'
+        self.decode_executor = decode_executor
+        self.loudness_target = loudness_target
+        self.true_peak_limit = true_peak_limit
+        self.encoder_pool = encoder_pool
+        self.output_profiles = output_profiles or DEFAULT_OUTPUT_PROFILES
+        self.instrumentation = instrumentation or Instrumentation()
+        self.decoded_assets = decoded_assets
     
     def get_audio_duration(self, file_path: str) -> float:
         """Get audio file duration in seconds"""
         try:
-            y, sr = librosa.load(file_path, sr=None)
-            return librosa.get_duration(y=y, sr=sr)
+            info = probe_audio(file_path)
+            return info['duration'] if info else 0.0
         except Exception as e:
             print(f"Error getting duration for {file_path}: {str(e)}")
             return 0.0
     
-    def create_fade_curve(self, duration: float, fade_type: str = 'linear') -> np.ndarray:
-        """Create fade curve for smooth transitions"""
-        if fade_type == 'linear':
-            return np.linspace(0, 1, int(duration * 1000))  # 1ms resolution
-        elif fade_type == 'exponential':
-            return np.power(np.linspace(0, 1, int(duration * 1000)), 2)
-        elif fade_type == 'logarithmic':
-            return np.log(np.linspace(1, np.e, int(duration * 1000)))
+    def apply_fade(self,
+                   audio: AudioSegment,
+                   fade_in_duration: float = 0,
+                   fade_out_duration: float = 0,
+                   fade_type: str = 'linear') -> AudioSegment:
+        """
+        Apply sample-accurate fade in/out (see fades.FADE_TYPES) to an audio
+        segment; only the faded frames are rescaled, the rest of the PCM is
+        copied through unchanged
+        """
+        if fade_in_duration <= 0 and fade_out_duration <= 0:
+            return audio
+        if audio.sample_width not in SAMPLE_DTYPES:
+            audio = audio.set_sample_width(2)
+        
+        data = bytearray(audio.raw_data)
+        pcm = np.frombuffer(data, dtype=SAMPLE_DTYPES[audio.sample_width]).reshape(-1, audio.channels)
+        total = len(pcm)
+        fade_in = min(int(fade_in_duration * audio.frame_rate), total)
+        fade_out = min(int(fade_out_duration * audio.frame_rate), total)
+        
+        # Fades that meet or overlap are one region, where their gains multiply
+        if fade_in >= total - fade_out:
+            regions = [(0, total)]
         else:
-            return np.linspace(0, 1, int(duration * 1000))
+            regions = [(0, fade_in), (total - fade_out, total)]
+        
+        full_scale = float(1 << (8 * audio.sample_width - 1))
+        for start, end in regions:
+            gains = fade_gains(start, end - start, total, fade_in, fade_out, fade_type)
+            if gains is None:
+                continue
+            region = pcm[start:end] * gains[:, np.newaxis].astype(np.float64)
+            np.rint(region, out=region)
+            np.clip(region, -full_scale, full_scale - 1, out=region)
+            pcm[start:end] = region
+        return audio._spawn(bytes(data))
     
-    def apply_fade(self, audio: AudioSegment, fade_in_duration: float = 0, fade_out_duration: float = 0) -> AudioSegment:
-        """Apply fade in/out to audio segment"""
-        if fade_in_duration > 0:
-            # Apply fade in manually
-            fade_ms = int(fade_in_duration * 1000)
-            audio = audio.fade_in(fade_ms)
+    def get_ducking_settings(self, music_track: Dict) -> Optional[Dict]:
+        """
+        Ducker settings for a music track; the bed ducks under speech unless the
+        track sets 'ducking': false, and a dict may override threshold (dBFS),
+        depth (dB), attack and release (seconds)
+        """
+        ducking = music_track.get('ducking', True)
+        if ducking is None or ducking is False:
+            return None
+        if not isinstance(ducking, dict):
+            ducking = {}
         
-        if fade_out_duration > 0:
-            # Apply fade out manually
-            fade_ms = int(fade_out_duration * 1000)
-            audio = audio.fade_out(fade_ms)
+        return {
+            'threshold': float(ducking.get('threshold', -40)),
+            'depth_db': float(ducking.get('depth', 12)),
+            'attack_ms': float(ducking.get('attack', 0.05)) * 1000,
+            'release_ms': float(ducking.get('release', 0.4)) * 1000
+        }
+    
+    def load_audio_file(self, file_path: str, use_cache: bool = False) -> Optional[AudioSegment]:
+        """Load audio file as an AudioSegment, decoded through the direct PCM pipe"""
+        source = self.load_source_samples(file_path, use_cache=use_cache)
+        if source is None:
+            return None
         
-        return audio
+        samples, sample_rate = source
+        return samples_to_segment(samples, sample_rate)
     
-    def load_audio_file(self, file_path: str) -> Optional[AudioSegment]:
-        """Load audio file with error handling"""
+    def load_source_samples(self,
+                            file_path: str,
+                            use_cache: bool = False,
+                            start_time: float = 0.0,
+                            duration: Optional[float] = None) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Decode an audio file at its own rate and channel layout, reusing cached
+        PCM for shared assets
+        
+        Args:
+            file_path: Audio file
+            use_cache: Look the whole source up in (and add it to) the PCM cache
+            start_time: Seconds into the source to start at
+            duration: Seconds to return from start_time (defaults to the rest)
+        
+        Returns:
+            (float32 (frames, channels) samples, sample rate), or None if the
+            file could not be loaded; cached samples are read-only
+        """
         try:
             if not os.path.exists(file_path):
                 print(f"Audio file not found: {file_path}")
                 return None
             
-            # Determine file format
-            file_ext = Path(file_path).suffix.lower()
+            cache_format = None
+            if use_cache and self.pcm_cache:
+                info = probe_audio(file_path)
+                if info:
+                    cache_format = (info['sample_rate'], info['channels'])
+                    cached = self.pcm_cache.get(file_path, *cache_format)
+                    if cached is not None:
+                        # Entries written before the direct decoder hold integer PCM
+                        cached = slice_window(cached, cache_format[0], start_time, duration)
+                        return pcm_to_samples(cached), cache_format[0]
             
-            if file_ext == '.mp3':
-                return AudioSegment.from_mp3(file_path)
-            elif file_ext == '.wav':
-                return AudioSegment.from_wav(file_path)
-            elif file_ext == '.flac':
-                return AudioSegment.from_file(file_path, format='flac')
-            elif file_ext in ['.m4a', '.aac']:
-                return AudioSegment.from_file(file_path, format='m4a')
-            elif file_ext == '.ogg':
-                return AudioSegment.from_file(file_path, format='ogg')
+            if cache_format:
+                # Shared assets are cached whole, so any window can be cut from them later
+                decoded = decode_to_array(file_path)
             else:
-                # Try to load with pydub's generic loader
-                return AudioSegment.from_file(file_path)
+                # Only the requested window is decoded, seeking in the container
+                decoded = decode_to_array(file_path, start_time=start_time, duration=duration)
+            if decoded is None:
+                return None
+            samples, sample_rate = decoded
+            
+            if cache_format:
+                if cache_format == (sample_rate, samples.shape[1]):
+                    try:
+                        self.pcm_cache.put(file_path, *cache_format, samples)
+                    except Exception as e:
+                        print(f"Error caching decoded audio for {file_path}: {str(e)}")
+                samples = slice_window(samples, sample_rate, start_time, duration)
+            
+            return samples, sample_rate
                 
         except Exception as e:
             print(f"Error loading audio file {file_path}: {str(e)}")
             return None
     
+    def get_render_format(self, file_paths: List[str], sources: Optional[AudioSources] = None) -> Tuple[int, int]:
+        """Pick the bus sample rate and channel count for a render from source headers"""
+        probe = sources.info if sources else probe_audio
+        formats = [probe(file_path) for file_path in file_paths]
+        return render_format(info for info in formats if info)
+    
+    def load_audio_samples(self,
+                           file_path: str,
+                           sample_rate: int,
+                           channels: int,
+                           scratch: Optional[ScratchSpace] = None,
+                           use_cache: bool = False,
+                           start_time: float = 0.0,
+                           duration: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Load an audio file, or the window of it starting at start_time and
+        lasting duration seconds, as float32 (frames, channels) samples, in a
+        scratch buffer if given
+        """
+        if use_cache and self.decoded_assets is not None:
+            # Shared assets are decoded once per batch and handed out read-only
+            samples = self.decoded_assets.get_or_decode(
+                file_path, sample_rate, channels,
+                lambda: self.decode_samples(file_path, sample_rate, channels, use_cache)
+            )
+            if samples is not None:
+                samples = slice_window(samples, sample_rate, start_time, duration)
+        else:
+            samples = self.decode_samples(file_path, sample_rate, channels, use_cache, start_time, duration)
+        if samples is None:
+            return None
+        
+        if scratch:
+            return scratch.store(samples)
+        # Segments are trimmed and faded in place, so shared samples are copied
+        return samples if samples.flags.writeable else samples.copy()
+    
+    def decode_samples(self,
+                       file_path: str,
+                       sample_rate: int,
+                       channels: int,
+                       use_cache: bool = False,
+                       start_time: float = 0.0,
+                       duration: Optional[float] = None) -> Optional[np.ndarray]:
+        """Decode an audio file (or a window of it) to float32 (frames, channels) samples in the render format"""
+        source = self.load_source_samples(file_path, use_cache, start_time, duration)
+        if source is None:
+            return None
+        
+        # Decoded at the source's own rate, then converted in a single pass
+        samples, source_rate = source
+        return to_render_format(samples, source_rate, sample_rate, channels)
+    
+    def load_handle_samples(self, handle: AudioHandle, sample_rate: int, channels: int) -> Optional[np.ndarray]:
+        """Loader for audio handles: decode a handle's window, through the shared caches when it allows them"""
+        try:
+            if handle.use_cache and (self.pcm_cache or self.decoded_assets is not None):
+                return self.load_audio_samples(handle.file_path, sample_rate, channels, None, True,
+                                               handle.start_time, handle.requested_duration)
+            return handle.decode(sample_rate, channels)
+        except Exception as e:
+            print(f"Error loading audio file {handle.file_path}: {str(e)}")
+            return None
+    
+    def take_handle_samples(self,
+                            handle: AudioHandle,
+                            sample_rate: int,
+                            channels: int,
+                            scratch: Optional[ScratchSpace] = None) -> Optional[np.ndarray]:
+        """Writable samples of a handle for in-place processing, in a scratch buffer if given"""
+        samples = handle.take(sample_rate, channels)
+        if samples is None:
+            return None
+        return scratch.store(samples) if scratch else samples
+    
+    def is_shared_source(self, info: Optional[Dict], sample_rate: int, channels: int) -> bool:
+        """Whether a source is small enough to decode whole into the shared caches"""
+        if not info:
+            return False
+        return info['duration'] * sample_rate * channels * 4 <= SHARED_SOURCE_MAX_BYTES
+    
+    def get_segment_cache_key(self, segment: Dict, sample_rate: int, channels: int) -> Optional[str]:
+        """
+        Segment cache key from the source content and its timing and fade
+        settings, so a re-render reprocesses only the segments that changed
+        """
+        audio_file = segment.get('audio_file')
+        if not self.pcm_cache or not audio_file or not os.path.exists(audio_file):
+            return None
+        
+        timing = segment.get('timing', {})
+        fade = segment.get('fade', {})
+        params = {
+            'start_offset': float(timing.get('start_offset', 0)),
+            'end_offset': float(timing.get('end_offset', 0)),
+            'fade_in': float(fade.get('fade_in', 0)),
+            'fade_out': float(fade.get('fade_out', 0)),
+            'fade_type': fade.get('fade_type', 'linear'),
+            'trim_silence': trim_settings(segment.get('trim_silence'))
+        }
+        try:
+            return self.pcm_cache.segment_key(audio_file, sample_rate, channels, params)
+        except OSError as e:
+            print(f"Error hashing {audio_file}: {str(e)}")
+            return None
+    
+    def segment_window(self, segment: Dict, info: Optional[Dict] = None) -> Tuple[float, Optional[float]]:
+        """
+        Start time and duration of the part of a segment's source that its
+        timing offsets keep (None runs to the end of the source); info is the
+        source's probe_audio result, if already known
+        """
+        timing = segment.get('timing', {})
+        start_offset = max(float(timing.get('start_offset', 0)), 0.0)
+        end_offset = max(float(timing.get('end_offset', 0)), 0.0)
+        if end_offset <= 0:
+            return start_offset, None
+        
+        # Only the header is read to turn the end offset into a duration
+        info = info or probe_audio(segment['audio_file'])
+        if not info:
+            return start_offset, None
+        return start_offset, max(0.0, info['duration'] - start_offset - end_offset)
+    
+    def render_segment(self, samples: np.ndarray, segment: Dict, sample_rate: int) -> List[np.ndarray]:
+        """
+        Remove a segment's silences and apply its fades in place
+        
+        Args:
+            samples: Writable float32 (frames, channels) samples of the source
+                window kept by the segment's timing offsets (see segment_window)
+            segment: Segment dictionary with trim_silence and fade settings
+            sample_rate: Sample rate of samples
+        
+        Returns:
+            The kept ranges in order, as views of samples that play back to back
+            (empty when the segment is entirely silent)
+        """
+        trim = trim_settings(segment.get('trim_silence'))
+        if trim:
+            # Each kept range stays where it is; nothing is moved in the buffer
+            pieces = [samples[start:end] for start, end in find_keep_ranges(samples, sample_rate, trim)]
+        else:
+            pieces = [samples]
+        
+        # Fades run over the pieces as one stream
+        fade = segment.get('fade', {})
+        total = sum(len(piece) for piece in pieces)
+        position = 0
+        for piece in pieces:
+            apply_fades(
+                piece,
+                int(float(fade.get('fade_in', 0)) * sample_rate),
+                int(float(fade.get('fade_out', 0)) * sample_rate),
+                fade.get('fade_type', 'linear'),
+                position,
+                total
+            )
+            position += len(piece)
+        return pieces
+    
+    def create_decode_pool(self, jobs: int):
+        """Create the executor for the decode stage, sized to the number of sources"""
+        workers = max(1, min(self.decode_workers, jobs))
+        if self.decode_executor == 'process':
+            return ProcessPoolExecutor(max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+    
+    def decode_in_processes(self,
+                            pool: ProcessPoolExecutor,
+                            handles: List[Optional[AudioHandle]],
+                            sample_rate: int,
+                            channels: int) -> List[Optional[np.ndarray]]:
+        """
+        Decode handles in worker processes, sending each only its file, window
+        and format; handles that go through the shared caches, which live in
+        this process, are decoded here while the workers run
+        """
+        shared = bool(self.pcm_cache) or self.decoded_assets is not None
+        futures = {}
+        for handle in handles:
+            if handle and not (handle.use_cache and shared) and id(handle) not in futures:
+                futures[id(handle)] = pool.submit(
+                    decode_window,
+                    handle.file_path,
+                    handle.start_time,
+                    handle.requested_duration,
+                    sample_rate,
+                    channels,
+                    handle.info
+                )
+        
+        results = [
+            self.take_handle_samples(handle, sample_rate, channels)
+            if handle and id(handle) not in futures else None
+            for handle in handles
+        ]
+        
+        taken = set()
+        for index, handle in enumerate(handles):
+            if handle is None or id(handle) not in futures:
+                continue
+            try:
+                samples = futures[id(handle)].result()
+            except Exception as e:
+                print(f"Error loading audio file {handle.file_path}: {str(e)}")
+                samples = None
+            # A window shared by several segments is decoded once; later uses get a copy
+            if samples is not None and id(handle) in taken:
+                samples = samples.copy()
+            taken.add(id(handle))
+            results[index] = samples
+        return results
+    
+    def plan_outputs(self, output_path: str) -> List[Dict]:
+        """
+        Output files for each profile: the first profile writes output_path,
+        the others write alongside it as <stem>_<profile name>.<extension>
+        """
+        base = Path(output_path)
+        outputs = []
+        for index, profile in enumerate(self.output_profiles):
+            output = dict(profile)
+            if index == 0:
+                output['path'] = str(base)
+            else:
+                extension = profile.get('extension', profile.get('format', 'mp3'))
+                output['path'] = str(base.with_name(f"{base.stem}_{profile['name']}.{extension}"))
+            outputs.append(output)
+        return outputs
+    
+    def describe_outputs(self, outputs: List[Dict], duration: float) -> List[Dict]:
+        """Path, format, size and duration of each encoded output"""
+        described = []
+        for output in outputs:
+            info = probe_audio(output['path'])
+            described.append({
+                'name': output.get('name'),
+                'path': output['path'],
+                'format': output.get('format', 'mp3'),
+                'bitrate': output.get('bitrate', '192k'),
+                'channels': info['channels'] if info else output.get('channels'),
+                'size_bytes': os.path.getsize(output['path']),
+                'duration': info['duration'] if info else duration
+            })
+        return described
+    
+    def export_samples(self, samples: np.ndarray, sample_rate: int, outputs: List[Dict]) -> None:
+        """
+        Pipe a float32 (frames, channels) buffer into one encoder per output,
+        with no intermediate WAV; the encoders run in parallel
+        """
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        channels = samples.shape[1]
+        
+        encoder = open_encoder(outputs, sample_rate, channels, self.encoder_pool)
+        try:
+            block_frames = max(1, int(self.block_seconds * sample_rate))
+            block = np.empty((block_frames, channels), dtype=np.float32)
+            for start in range(0, len(samples), block_frames):
+                current = block[:min(block_frames, len(samples) - start)]
+                np.clip(samples[start:start + len(current)], -1.0, 1.0, out=current)
+                encoder.write(current)
+            encoder.close()
+        except Exception:
+            encoder.abort()
+            raise
+    
     def create_silence(self, duration: float) -> AudioSegment:
         """Create silence segment of specified duration"""
         return AudioSegment.silent(duration=duration * 1000)  # Convert to milliseconds
     
     def mix_audio_layers(self, layers: List[Dict]) -> AudioSegment:
         """
-        Mix multiple audio layers with precise timing
+        Mix multiple audio layers with precise timing into one float32 bus
         
         Args:
             layers: List of layer dictionaries with keys:
-                - audio: AudioSegment or file path
+                - audio: AudioSegment, file path or AudioHandle
                 - start_time: Start time in seconds
                 - volume: Volume adjustment in dB
                 - fade_in: Fade in duration
                 - fade_out: Fade out duration
+                - fade_type: Fade curve (linear, exponential, logarithmic, equal_power)
         
         Returns:
             Mixed AudioSegment
         """
         try:
-            # Find total duration
-            max_end_time = 0
-            for layer in layers:
-                if isinstance(layer['audio'], str):
-                    duration = self.get_audio_duration(layer['audio'])
-                else:
-                    duration = len(layer['audio']) / 1000  # Convert from ms to seconds
-                
-                end_time = layer['start_time'] + duration
-                max_end_time = max(max_end_time, end_time)
-            
-            # Create base silence
-            mixed_audio = self.create_silence(max_end_time)
-            
-            # Add each layer
-            for layer in layers:
-                # Load audio if it's a file path
-                if isinstance(layer['audio'], str):
-                    audio = self.load_audio_file(layer['audio'])
-                else:
-                    audio = layer['audio']
-                
-                if audio is None:
-                    continue
-                
-                # Apply volume adjustment
-                if 'volume' in layer:
-                    audio = audio + layer['volume']
-                
-                # Apply fades
-                audio = self.apply_fade(
-                    audio,
-                    fade_in_duration=layer.get('fade_in', 0),
-                    fade_out_duration=layer.get('fade_out', 0)
-                )
-                
-                # Calculate position in milliseconds
-                start_ms = layer['start_time'] * 1000
-                
-                # Overlay the audio
-                mixed_audio = mixed_audio.overlay(audio, position=start_ms)
-            
-            return mixed_audio
+            # File paths become handles: probed once for the bus size, then
+            # decoded once, straight to the bus format
+            sources = AudioSources(loader=self.load_handle_samples)
+            mixer = AudioMixer(loader=sources.open)
+            mixed = mixer.mix_to_segment(layers)
+            sources.release()
+            return mixed
             
         except Exception as e:
             print(f"Error mixing audio layers: {str(e)}")
@@ -170,95 +563,162 @@ class AdvancedAudioProcessor:
                 output_filename = f"episode_{uuid.uuid4().hex[:8]}.mp3"
             
             output_path = self.output_dir / output_filename
+            loudness = None
             
-            # Process segments
-            segment_layers = []
-            total_duration = 0
+            if self.streaming:
+                return self.stream_template_segments(segments, music_track, str(output_path))
             
-            for segment in segments:
-                audio_file = segment.get('audio_file')
-                if not audio_file:
-                    continue
+            with ScratchSpace(self.scratch_dir, self.use_memmap) as scratch:
+                # Every file is probed once for the whole render, and each file
+                # and window is decoded at most once however many segments use it
+                sources = AudioSources(loader=self.load_handle_samples)
                 
-                # Load segment audio
-                audio = self.load_audio_file(audio_file)
-                if audio is None:
-                    continue
-                
-                # Get segment timing
-                start_offset = float(segment.get('timing', {}).get('start_offset', 0))
-                end_offset = float(segment.get('timing', {}).get('end_offset', 0))
-                
-                # Apply timing offsets
-                if start_offset > 0:
-                    audio = audio[start_offset * 1000:]  # Convert to milliseconds
-                
-                if end_offset > 0:
-                    audio = audio[:-end_offset * 1000]  # Remove from end
+                music_file = None
+                if music_track and music_track.get('type') == 'upload':
+                    music_file = music_track.get('file_path')
+                    if not (music_file and os.path.exists(music_file)):
+                        music_file = None
                 
-                # Apply fades
-                fade_in_duration = float(segment.get('fade', {}).get('fade_in', 0))
-                fade_out_duration = float(segment.get('fade', {}).get('fade_out', 0))
+                # One bus format for the whole render, chosen from the headers
+                source_files = [segment.get('audio_file') for segment in segments if segment.get('audio_file')]
+                sample_rate, channels = self.get_render_format(source_files + ([music_file] if music_file else []), sources)
                 
-                audio = self.apply_fade(audio, fade_in_duration, fade_out_duration)
+                with self.instrumentation.span('decode', progress=10):
+                    # Segments whose source and processing parameters are unchanged
+                    # since an earlier render come straight from the segment cache
+                    segment_keys = [self.get_segment_cache_key(segment, sample_rate, channels) for segment in segments]
+                    cached_segments = [
+                        self.pcm_cache.get_segment(key, channels) if key else None
+                        for key in segment_keys
+                    ]
+                    
+                    # Only the part of each source left by its timing offsets is decoded
+                    handles = [
+                        sources.open(
+                            segment['audio_file'],
+                            *self.segment_window(segment, sources.info(segment['audio_file'])),
+                            use_cache=self.is_shared_source(sources.info(segment['audio_file']), sample_rate, channels)
+                        ) if segment.get('audio_file') and cached is None else None
+                        for segment, cached in zip(segments, cached_segments)
+                    ]
+                    music_handle = sources.open(music_file, use_cache=True) if music_file else None
+                    
+                    # Start decoding every other segment and the music bed at once;
+                    # worker processes cannot share the scratch space, so their
+                    # results are copied into it here
+                    in_process = self.decode_executor != 'process'
+                    with self.create_decode_pool(len(source_files) + 1) as pool:
+                        if in_process:
+                            futures = [
+                                pool.submit(self.take_handle_samples, handle, sample_rate, channels, scratch)
+                                if handle else None
+                                for handle in handles + [music_handle]
+                            ]
+                            decoded = [future.result() if future else None for future in futures]
+                        else:
+                            decoded = self.decode_in_processes(pool, handles + [music_handle], sample_rate, channels)
+                        decoded_segments, music_samples = decoded[:-1], decoded[-1]
                 
-                # Add to layers
-                segment_layers.append({
-                    'audio': audio,
-                    'start_time': total_duration,
-                    'volume': 0,  # Normal volume
-                    'fade_in': 0,
-                    'fade_out': 0
-                })
-                
-                total_duration += len(audio) / 1000  # Convert from ms to seconds
-            
-            # Add music track if specified
-            if music_track and music_track.get('type') == 'upload':
-                music_file = music_track.get('file_path')
-                if music_file and os.path.exists(music_file):
-                    music_audio = self.load_audio_file(music_file)
-                    if music_audio:
-                        # Loop music if needed
-                        music_duration = len(music_audio) / 1000
-                        if music_duration < total_duration:
-                            # Calculate how many loops needed
-                            loops_needed = int(total_duration / music_duration) + 1
-                            music_audio = music_audio * loops_needed
+                with self.instrumentation.span('render_segments', progress=30):
+                    # Process segments in timeline order
+                    segment_layers = []
+                    chapters = []
+                    total_duration = 0
+                    segments_cached = 0
+                    
+                    for segment, key, cached, samples in zip(segments, segment_keys, cached_segments, decoded_segments):
+                        if cached is not None:
+                            pieces = [cached]
+                            segments_cached += 1
+                        else:
+                            if samples is None:
+                                continue
+                            if not in_process:
+                                samples = scratch.store(samples)
+                            
+                            pieces = self.render_segment(samples, segment, sample_rate)
+                            if key:
+                                self.pcm_cache.put_segment(
+                                    key, pieces[0] if len(pieces) == 1 else np.concatenate([samples[:0]] + pieces)
+                                )
+                        
+                        # Entirely silent segments leave no layer or chapter, as when streaming
+                        pieces = [piece for piece in pieces if len(piece)]
+                        if not pieces:
+                            continue
                         
-                        # Trim to exact duration
-                        music_audio = music_audio[:total_duration * 1000]
+                        # Each kept range is its own layer, placed back to back;
+                        # trims and fades are already in the samples
+                        segment_start = total_duration
+                        for piece in pieces:
+                            segment_layers.append({
+                                'audio': piece,
+                                'start_time': total_duration,
+                                'volume': float(segment.get('volume', 0))
+                            })
+                            total_duration += len(piece) / sample_rate
                         
-                        # Apply music settings
-                        music_start = float(music_track.get('start_point', 0))
-                        music_fade_in = float(music_track.get('fade_in', 2))
-                        music_fade_out = float(music_track.get('fade_out', 3))
+                        chapters.append({
+                            'title': chapter_title(segment),
+                            'start': segment_start,
+                            'end': total_duration
+                        })
+                
+                with self.instrumentation.span('mix', progress=50):
+                    # Add music track if specified
+                    if music_samples is not None and len(music_samples) and total_duration > 0:
+                        if not in_process:
+                            music_samples = scratch.store(music_samples)
                         
-                        # Apply fades
-                        music_audio = self.apply_fade(music_audio, music_fade_in, music_fade_out)
+                        # Loop the single decoded bed on demand up to the episode length
+                        music_bed = LoopedSource(
+                            music_samples,
+                            frames=int(round(total_duration * sample_rate)),
+                            crossfade=int(float(music_track.get('loop_crossfade', 0)) * sample_rate)
+                        )
                         
-                        # Add music as background layer (lower volume)
+                        # Add music as background layer (lower volume, ducked under speech);
+                        # the mixer applies the fades and ducking in its single pass
                         segment_layers.append({
-                            'audio': music_audio,
-                            'start_time': music_start,
-                            'volume': -10,  # Lower volume for background
-                            'fade_in': music_fade_in,
-                            'fade_out': music_fade_out
+                            'audio': music_bed,
+                            'start_time': float(music_track.get('start_point', 0)),
+                            'volume': float(music_track.get('volume', -10)),  # Lower volume for background
+                            'fade_in': float(music_track.get('fade_in', 2)),
+                            'fade_out': float(music_track.get('fade_out', 3)),
+                            'fade_type': music_track.get('fade_type', 'linear'),
+                            'duck': self.get_ducking_settings(music_track)
                         })
+                    
+                    # Mix all layers into the (optionally memory-mapped) bus
+                    mixer = AudioMixer(sample_rate, channels, loader=sources.open, scratch=scratch)
+                    bus = mixer.mix(segment_layers)
+                
+                # Two passes over the bus: measure integrated loudness, then gain and limit
+                if self.loudness_target is not None:
+                    with self.instrumentation.span('loudness', progress=70):
+                        loudness = normalize_loudness(bus, mixer.sample_rate, self.loudness_target,
+                                                      self.true_peak_limit, self.block_seconds)
+                
+                with self.instrumentation.span('encode', progress=80):
+                    # Export every rendition straight from the bus
+                    outputs = self.plan_outputs(str(output_path))
+                    self.export_samples(bus, mixer.sample_rate, outputs)
+                    duration = len(bus) / mixer.sample_rate
             
-            # Mix all layers
-            final_audio = self.mix_audio_layers(segment_layers)
-            
-            # Export final audio
-            final_audio.export(str(output_path), format='mp3', bitrate='192k')
-            
-            return {
+            result = {
                 'success': True,
                 'output_path': str(output_path),
-                'duration': len(final_audio) / 1000,
+                'duration': duration,
+                'outputs': self.describe_outputs(outputs, duration),
                 'segments_processed': len(segments),
-                'music_track_used': music_track is not None
+                'segments_cached': segments_cached,
+                'music_track_used': music_track is not None,
+                'chapters': chapters
             }
+            if loudness:
+                result['loudness'] = loudness
+            
+            return result
             
         except Exception as e:
             print(f"Error processing template segments: {str(e)}")
@@ -267,15 +727,134 @@ class AdvancedAudioProcessor:
                 'error': str(e)
             }
     
+    def stream_template_segments(self,
+                                 segments: List[Dict],
+                                 music_track: Dict,
+                                 output_path: str) -> Dict:
+        """
+        Render template segments block by block, decoding only the sources
+        audible in each block and sending every block straight to the encoder
+        
+        Args:
+            segments: List of segment dictionaries
+            music_track: Music track configuration
+            output_path: Output file path
+        
+        Returns:
+            Dictionary with processing results
+        """
+        with self.instrumentation.span('prepare', progress=10):
+            sources = []
+            chapters = []
+            formats = []
+            total_duration = 0
+            
+            for segment in segments:
+                audio_file = segment.get('audio_file')
+                if not audio_file:
+                    continue
+                
+                # Segment length comes from the headers; nothing is decoded yet
+                info = probe_audio(audio_file)
+                if not info:
+                    continue
+                formats.append(info)
+                
+                start_offset = float(segment.get('timing', {}).get('start_offset', 0))
+                end_offset = float(segment.get('timing', {}).get('end_offset', 0))
+                duration = info['duration'] - max(start_offset, 0) - max(end_offset, 0)
+                if duration <= 0:
+                    continue
+                
+                # Silence trimming only moves source offsets: each kept range
+                # becomes its own source, placed back to back
+                pieces = [(0.0, duration)]
+                trim = trim_settings(segment.get('trim_silence'))
+                if trim:
+                    ranges = analyze_file(audio_file, trim, max(start_offset, 0), duration)
+                    if ranges is not None:
+                        pieces = ranges
+                
+                if pieces:
+                    chapters.append({
+                        'title': chapter_title(segment),
+                        'start': total_duration,
+                        'end': total_duration + sum(end - start for start, end in pieces)
+                    })
+                
+                for index, (start, end) in enumerate(pieces):
+                    sources.append({
+                        'audio': audio_file,
+                        'start_time': total_duration,
+                        'offset': max(start_offset, 0) + start,
+                        'duration': end - start,
+                        'volume': float(segment.get('volume', 0)),
+                        'fade_in': float(segment.get('fade', {}).get('fade_in', 0)) if index == 0 else 0.0,
+                        'fade_out': float(segment.get('fade', {}).get('fade_out', 0)) if index == len(pieces) - 1 else 0.0,
+                        'fade_type': segment.get('fade', {}).get('fade_type', 'linear')
+                    })
+                    
+                    total_duration += end - start
+            
+            if music_track and music_track.get('type') == 'upload':
+                music_file = music_track.get('file_path')
+                music_info = probe_audio(music_file) if music_file and total_duration > 0 else None
+                if music_info:
+                    formats.append(music_info)
+                    sources.append({
+                        'audio': music_file,
+                        'start_time': float(music_track.get('start_point', 0)),
+                        'duration': total_duration,
+                        'volume': float(music_track.get('volume', -10)),  # Lower volume for background
+                        'fade_in': float(music_track.get('fade_in', 2)),
+                        'fade_out': float(music_track.get('fade_out', 3)),
+                        'fade_type': music_track.get('fade_type', 'linear'),
+                        'duck': self.get_ducking_settings(music_track),
+                        'loop': True,
+                        'loop_crossfade': float(music_track.get('loop_crossfade', 0))
+                    })
+        
+        # One bus format for both render paths, capped for the encoders
+        sample_rate, channels = render_format(formats)
+        renderer = StreamingRenderer(
+            sample_rate=sample_rate,
+            channels=channels,
+            block_seconds=self.block_seconds,
+            loudness_target=self.loudness_target,
+            true_peak_limit=self.true_peak_limit,
+            scratch_dir=self.scratch_dir,
+            encoder_pool=self.encoder_pool
+        )
+        outputs = self.plan_outputs(output_path)
+        # Decode, mix and encode overlap block by block, so they share one span
+        with self.instrumentation.span('stream_render', progress=30):
+            result = renderer.render(sources, outputs=outputs)
+        
+        response = {
+            'success': True,
+            'output_path': output_path,
+            'duration': result['duration'],
+            'outputs': self.describe_outputs(outputs, result['duration']),
+            'segments_processed': len(segments),
+            'music_track_used': music_track is not None,
+            'chapters': chapters,
+            'streaming': True
+        }
+        if 'loudness' in result:
+            response['loudness'] = result['loudness']
+        
+        return response
+    
     def create_episode_from_template(self, 
-                                   template_data: Dict, 
+                                   template_data, 
                                    episode_data: Dict,
                                    output_filename: str = None) -> Dict:
         """
         Create a complete episode from template and episode data
         
         Args:
-            template_data: Template structure and configuration
+            template_data: Compiled RenderPlan, or a template dictionary whose
+                'content' holds the template structure
             episode_data: Episode-specific content and audio files
             output_filename: Output filename (optional)
         
@@ -286,48 +865,31 @@ class AdvancedAudioProcessor:
             if not output_filename:
                 output_filename = f"episode_{uuid.uuid4().hex[:8]}.mp3"
             
-            # Extract template structure
-            structure = template_data.get('content', {})
-            segments = structure.get('segments', [])
-            music_track = structure.get('music_track')
-            ai_segments = structure.get('ai_segments')
-            
-            # Process AI segments if present
-            if ai_segments and episode_data.get('ai_content'):
-                # This would integrate with ElevenLabs service
-                # For now, we'll use placeholder audio
-                pass
+            # Workers pass plans from the per-version plan cache; anything
+            # else is validated and compiled here
+            if isinstance(template_data, RenderPlan):
+                plan = template_data
+            else:
+                plan = compile_structure(template_data.get('content', {}))
             
             # Map episode audio files to template segments
-            episode_audio_files = episode_data.get('audio_files', [])
-            
-            # Process segments with actual audio files
-            processed_segments = []
-            for segment in segments:
-                # Find matching audio file for this segment
-                segment_audio = None
-                for audio_file in episode_audio_files:
-                    if audio_file.get('segment_type') == segment.get('type'):
-                        segment_audio = audio_file.get('file_path')
-                        break
-                
-                if segment_audio:
-                    processed_segments.append({
-                        'audio_file': segment_audio,
-                        'timing': segment.get('timing', {}),
-                        'fade': segment.get('fade', {}),
-                        'type': segment.get('type')
-                    })
+            processed_segments = plan.bind(episode_data.get('audio_files', []))
             
             # Process the episode
             result = self.process_template_segments(
                 segments=processed_segments,
-                music_track=music_track,
+                music_track=plan.music_track(),
                 output_filename=output_filename
             )
             
             return result
             
+        except TemplateError as e:
+            print(f"Invalid template: {str(e)}")
+            return {
+                'success': False,
+                'error': f"Invalid template: {e}"
+            }
         except Exception as e:
             print(f"Error creating episode from template: {str(e)}")
             return {
@@ -335,30 +897,71 @@ class AdvancedAudioProcessor:
                 'error': str(e)
             }
     
-    def normalize_audio(self, audio: AudioSegment, target_dBFS: float = -20.0) -> AudioSegment:
-        """Normalize audio to target dBFS level"""
+    def normalize_audio(self,
+                        audio: AudioSegment,
+                        target_lufs: float = -16.0,
+                        true_peak_limit: Optional[float] = -1.0) -> AudioSegment:
+        """
+        Normalize audio to an integrated loudness (EBU R128 / ITU-R BS.1770)
+        
+        The first pass measures gated loudness block by block; the second applies
+        the gain and, unless true_peak_limit is None, limits true peaks to that ceiling.
+        """
         try:
-            change_in_dBFS = target_dBFS - audio.dBFS
-            return audio.apply_gain(change_in_dBFS)
+            samples = segment_to_samples(audio)
+            normalize_loudness(samples, audio.frame_rate, target_lufs, true_peak_limit, self.block_seconds)
+            return samples_to_segment(samples, audio.frame_rate, audio.sample_width)
         except Exception as e:
             print(f"Error normalizing audio: {str(e)}")
             return audio
     
-    def compress_audio(self, audio: AudioSegment, threshold: float = -20.0, ratio: float = 4.0) -> AudioSegment:
-        """Apply compression to audio"""
+    def compress_audio(self,
+                       audio: AudioSegment,
+                       threshold: float = -20.0,
+                       ratio: float = 4.0,
+                       attack_ms: float = 10.0,
+                       release_ms: float = 150.0,
+                       knee_db: float = 6.0,
+                       makeup_db: float = 0.0) -> AudioSegment:
+        """Apply dynamic range compression to audio"""
         try:
-            # Simple compression implementation
-            # In a real implementation, you'd use a proper compressor
-            return audio
+            compressor = Compressor(
+                audio.frame_rate,
+                threshold=threshold,
+                ratio=ratio,
+                attack_ms=attack_ms,
+                release_ms=release_ms,
+                knee_db=knee_db,
+                makeup_db=makeup_db
+            )
+            samples = segment_to_samples(audio)
+            
+            # Process in blocks, exactly as a streaming render would
+            block_frames = int(self.block_seconds * audio.frame_rate)
+            for start in range(0, len(samples), block_frames):
+                block = samples[start:start + block_frames]
+                compressor.process(block, out=block)
+            
+            return samples_to_segment(samples, audio.frame_rate, audio.sample_width)
         except Exception as e:
             print(f"Error compressing audio: {str(e)}")
             return audio
     
     def add_metadata(self, audio_path: str, metadata: Dict) -> bool:
-        """Add metadata to audio file"""
+        """
+        Tag a rendered file in place (ID3v2 for MP3, Vorbis comments for Opus/Ogg);
+        only the tag header is rewritten, the encoded audio is not touched
+        
+        Args:
+            audio_path: Rendered episode file
+            metadata: Tag values as accepted by tagging.write_tags, e.g. title,
+                episode_number, season_number, cover_art and chapters
+        
+        Returns:
+            True if the file was tagged
+        """
         try:
-            # This would use a library like mutagen to add ID3 tags
-            # For now, we'll just return success
+            write_tags(audio_path, metadata)
             return True
         except Exception as e:
             print(f"Error adding metadata: {str(e)}")
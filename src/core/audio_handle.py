@@ -0,0 +1,215 @@
+"""
+Audio Handles
+Lazy references to source files: duration and format come from the headers
+right away, and samples are decoded only when asked for, once per render
+"""
+
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .audio_probe import probe_audio
+from .audio_stream import decode_to_array
+from .resample import to_render_format
+
+# Decodes a handle's window at (sample_rate, channels), or returns None
+HandleLoader = Callable[['AudioHandle', int, int], Optional[np.ndarray]]
+
+
+def decode_window(file_path: str,
+                  start_time: float = 0.0,
+                  duration: Optional[float] = None,
+                  sample_rate: Optional[int] = None,
+                  channels: Optional[int] = None,
+                  info: Optional[Dict] = None) -> Optional[np.ndarray]:
+    """
+    Decode a window of a file to float32 (frames, channels) samples in the
+    given format (defaults to the source's); takes only plain values, so it
+    can run in a worker process
+    """
+    decoded = decode_to_array(file_path, start_time=start_time, duration=duration, info=info)
+    if decoded is None:
+        return None
+    samples, source_rate = decoded
+    return to_render_format(samples, source_rate, sample_rate or source_rate, channels or samples.shape[1])
+
+
+class AudioHandle:
+    """
+    A source file, or a window of it, that is probed up front and decoded on
+    first use; decoded samples are memoized per format and shared read-only
+    """
+
+    def __init__(self,
+                 file_path: str,
+                 start_time: float = 0.0,
+                 duration: Optional[float] = None,
+                 info: Optional[Dict] = None,
+                 loader: Optional[HandleLoader] = None,
+                 use_cache: bool = False):
+        """
+        Args:
+            file_path: Audio file
+            start_time: Seconds into the file where the window starts
+            duration: Window length in seconds (defaults to the rest of the file)
+            info: probe_audio result for the file (probed here if not given)
+            loader: Decodes the window (defaults to AudioHandle.decode)
+            use_cache: Whether the loader may use shared caches for this source
+        """
+        self.file_path = str(file_path)
+        self.info = info if info is not None else probe_audio(self.file_path)
+        self.start_time = max(0.0, float(start_time))
+        self.requested_duration = None if duration is None else max(0.0, float(duration))
+        self.loader = loader
+        self.use_cache = use_cache
+        self.users = 0
+        self._samples: Dict[Tuple[int, int], np.ndarray] = {}
+        self._failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether the file's headers could be read"""
+        return self.info is not None
+
+    @property
+    def sample_rate(self) -> Optional[int]:
+        """Sample rate of the source"""
+        return self.info['sample_rate'] if self.info else None
+
+    @property
+    def channels(self) -> Optional[int]:
+        """Channel count of the source"""
+        return self.info['channels'] if self.info else None
+
+    @property
+    def duration(self) -> float:
+        """Length of the window in seconds, from the headers alone"""
+        if not self.info:
+            return 0.0
+        duration = max(0.0, self.info['duration'] - self.start_time)
+        if self.requested_duration is not None:
+            duration = min(duration, self.requested_duration)
+        return duration
+
+    def stream_format(self) -> Optional[Dict]:
+        """Duration, sample rate and channels of the window, or None if unreadable"""
+        if not self.info:
+            return None
+        return {'duration': self.duration, 'sample_rate': self.sample_rate, 'channels': self.channels}
+
+    def decode(self, sample_rate: Optional[int] = None, channels: Optional[int] = None) -> Optional[np.ndarray]:
+        """Decode the window straight from the file, converted to the given format (no memoization)"""
+        return decode_window(self.file_path, self.start_time, self.requested_duration,
+                             sample_rate, channels, self.info)
+
+    def _load(self, key: Tuple[int, int]) -> Optional[np.ndarray]:
+        """Memoized samples for a format; the caller holds the lock"""
+        samples = self._samples.get(key)
+        if samples is None and not self._failed:
+            if self.loader:
+                samples = self.loader(self, *key)
+            else:
+                samples = self.decode(*key)
+            if samples is None:
+                # A file that failed once is not decoded again for the same render
+                self._failed = True
+                return None
+            samples.setflags(write=False)
+            self._samples[key] = samples
+        return samples
+
+    def _key(self, sample_rate: Optional[int], channels: Optional[int]) -> Tuple[int, int]:
+        """Memo key, defaulting to the source's own format"""
+        return (int(sample_rate or self.sample_rate or 0), int(channels or self.channels or 0))
+
+    def samples(self, sample_rate: Optional[int] = None, channels: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Read-only float32 (frames, channels) samples of the window in the given
+        format (defaults to the source's), decoded on the first call
+        """
+        with self._lock:
+            return self._load(self._key(sample_rate, channels))
+
+    def take(self, sample_rate: Optional[int] = None, channels: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Writable samples for a user that processes them in place: the last
+        user of the handle is given the memoized buffer itself, earlier users
+        get a copy
+        """
+        key = self._key(sample_rate, channels)
+        with self._lock:
+            samples = self._load(key)
+            if samples is None:
+                return None
+            self.users -= 1
+            if self.users > 0:
+                return samples.copy()
+            del self._samples[key]
+
+        try:
+            samples.setflags(write=True)
+        except ValueError:
+            # Memory the handle does not own (e.g. a read-only cache mapping)
+            samples = samples.copy()
+        return samples
+
+    def release(self) -> None:
+        """Drop the memoized samples"""
+        with self._lock:
+            self._samples.clear()
+
+
+class AudioSources:
+    """
+    The handles of one render: each file is probed once, and each file and
+    window is decoded at most once however many layers use it
+    """
+
+    def __init__(self, loader: Optional[HandleLoader] = None):
+        """
+        Args:
+            loader: Decodes a handle's window (defaults to AudioHandle.decode)
+        """
+        self.loader = loader
+        self._handles: Dict[Tuple, AudioHandle] = {}
+        self._info: Dict[str, Optional[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def info(self, file_path: str) -> Optional[Dict]:
+        """probe_audio result for a file, probed once per render"""
+        path = os.path.abspath(str(file_path))
+        with self._lock:
+            if path not in self._info:
+                self._info[path] = probe_audio(path)
+            return self._info[path]
+
+    def open(self,
+             file_path: str,
+             start_time: float = 0.0,
+             duration: Optional[float] = None,
+             use_cache: bool = False) -> AudioHandle:
+        """Get the handle for a file and window, counting the caller as one of its users"""
+        path = os.path.abspath(str(file_path))
+        key = (path, round(max(0.0, float(start_time)), 6),
+               None if duration is None else round(max(0.0, float(duration)), 6))
+        info = self.info(path)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = AudioHandle(file_path, start_time, duration, info=info, loader=self.loader)
+                self._handles[key] = handle
+            handle.use_cache = handle.use_cache or use_cache
+        with handle._lock:
+            handle.users += 1
+        return handle
+
+    def release(self) -> None:
+        """Drop every handle's decoded samples once the render is done"""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            handle.release()
@@ -0,0 +1,319 @@
+"""
+Audio Mixer
+Sums timed audio layers into a single preallocated float32 sample buffer
+"""
+
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from pydub import AudioSegment
+
+from .dynamics import Ducker
+from .fades import fade_gains
+from .pcm_buffer import ScratchSpace
+from .resample import render_format, to_render_format
+
+# pydub stores samples as signed little-endian integers of these widths
+SAMPLE_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+
+# Layers are added to the bus in chunks so gain and fades never copy a whole layer
+MIX_CHUNK_FRAMES = 65536
+
+
+def segment_to_samples(audio: AudioSegment) -> np.ndarray:
+    """Convert an AudioSegment to a float32 array of shape (frames, channels) in [-1, 1]"""
+    if audio.sample_width not in SAMPLE_DTYPES:
+        audio = audio.set_sample_width(2)
+
+    samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_DTYPES[audio.sample_width])
+    return pcm_to_samples(samples.reshape(-1, audio.channels))
+
+
+def pcm_to_samples(pcm: np.ndarray) -> np.ndarray:
+    """Scale integer PCM to float32 in [-1, 1]; float32 input is returned as is"""
+    if pcm.dtype == np.float32:
+        return pcm
+
+    scale = float(1 << (8 * pcm.dtype.itemsize - 1))
+    samples = pcm.astype(np.float32)
+    samples /= scale
+    return samples
+
+
+def samples_to_segment(samples: np.ndarray, sample_rate: int, sample_width: int = 2) -> AudioSegment:
+    """
+    Convert a float32 (frames, channels) array back to an AudioSegment,
+    clipping to full scale; the exact inverse of segment_to_samples, so
+    integer PCM survives a round trip unchanged
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+
+    scale = float(1 << (8 * sample_width - 1))
+    pcm = np.empty(samples.shape, dtype=SAMPLE_DTYPES[sample_width])
+    for position in range(0, len(samples), MIX_CHUNK_FRAMES):
+        # Rounded in float64, which holds every 32-bit sample value exactly
+        chunk = samples[position:position + MIX_CHUNK_FRAMES].astype(np.float64)
+        chunk *= scale
+        np.rint(chunk, out=chunk)
+        np.clip(chunk, -scale, scale - 1, out=chunk)
+        pcm[position:position + MIX_CHUNK_FRAMES] = chunk
+    return AudioSegment(
+        data=pcm.tobytes(),
+        sample_width=sample_width,
+        frame_rate=int(sample_rate),
+        channels=int(samples.shape[1])
+    )
+
+
+def db_to_gain(db: float) -> float:
+    """Convert a dB adjustment to a linear amplitude factor"""
+    return float(10 ** (db / 20.0))
+
+
+class LoopedSource:
+    """
+    Repeats one decoded loop on demand, reading by position instead of
+    materializing the looped bed; supports len() and slicing like a sample array
+    """
+
+    def __init__(self, loop: np.ndarray, frames: int, crossfade: int = 0):
+        """
+        Args:
+            loop: float32 (frames, channels) samples of a single loop
+            frames: Total length of the bed in frames
+            crossfade: Frames blended across each loop seam
+        """
+        self.loop = loop if loop.ndim > 1 else loop[:, np.newaxis]
+        self.frames = int(frames)
+        self.crossfade = max(0, min(int(crossfade), len(self.loop) // 2))
+        self.period = len(self.loop) - self.crossfade
+        self.shape = (self.frames, self.loop.shape[1])
+
+        # The seam mixes the head of the loop with the tail of the previous repeat
+        self.seam = None
+        if self.crossfade:
+            ramp = np.linspace(0.0, 1.0, self.crossfade, dtype=np.float32)[:, np.newaxis]
+            self.seam = (self.loop[:self.crossfade] * ramp
+                         + self.loop[self.period:] * (1.0 - ramp)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, slice):
+            raise TypeError("LoopedSource only supports slicing")
+        start, stop, step = key.indices(self.frames)
+        if step != 1:
+            raise ValueError("LoopedSource slices must be contiguous")
+        return self.read(start, max(0, stop - start))
+
+    def read(self, start: int, count: int) -> np.ndarray:
+        """Return count looped frames starting at bed position start"""
+        if self.period <= 0 or count <= 0:
+            return np.zeros((max(count, 0), self.loop.shape[1]), dtype=np.float32)
+
+        offset = start % self.period
+        first_repeat = start < self.period
+        if offset + count <= self.period and (first_repeat or self.seam is None or offset >= self.crossfade):
+            # Inside one repeat and clear of the seam: a plain view of the loop
+            return self.loop[offset:offset + count]
+
+        positions = np.arange(start, start + count)
+        index = positions % self.period
+        samples = self.loop[index]
+        if self.seam is not None:
+            in_seam = (positions >= self.period) & (index < self.crossfade)
+            samples[in_seam] = self.seam[index[in_seam]]
+        return samples
+
+
+class AudioMixer:
+    """Mixes layer dictionaries into one float32 bus, converting formats only once"""
+
+    def __init__(self,
+                 sample_rate: Optional[int] = None,
+                 channels: Optional[int] = None,
+                 loader: Optional[Callable[[str], object]] = None,
+                 scratch: Optional[ScratchSpace] = None):
+        """
+        Args:
+            sample_rate: Bus sample rate (defaults to the highest layer rate)
+            channels: Bus channel count (defaults to the widest layer)
+            loader: Callable used to open layers given as file paths; returns an
+                AudioSegment or a lazy AudioHandle (e.g. AudioSources.open)
+            scratch: Allocator for the mix bus (memmap-backed when configured)
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = 2
+        self.loader = loader or AudioSegment.from_file
+        self.scratch = scratch or ScratchSpace()
+
+    def _layer_format(self, layer: Dict, audio) -> Optional[Dict]:
+        """Get duration and stream format for a layer without decoding file paths or handles"""
+        if audio is None:
+            return None
+        if hasattr(audio, 'stream_format'):
+            # AudioHandle: known from the headers, decoded only when mixed
+            return audio.stream_format()
+
+        if isinstance(audio, (np.ndarray, LoopedSource)):
+            # Sample arrays and loops are already (frames, channels) float32 at the bus rate
+            sample_rate = layer.get('sample_rate') or self.sample_rate or 44100
+            return {
+                'duration': len(audio) / sample_rate,
+                'sample_rate': sample_rate,
+                'channels': audio.shape[1] if len(audio.shape) > 1 else 1
+            }
+
+        return {
+            'duration': len(audio) / 1000,
+            'sample_rate': audio.frame_rate,
+            'channels': audio.channels,
+            'sample_width': audio.sample_width
+        }
+
+    def _to_bus_samples(self, audio: AudioSegment) -> np.ndarray:
+        """Convert a layer to the bus format once, before it is mixed, and return its samples"""
+        return to_render_format(segment_to_samples(audio), audio.frame_rate, self.sample_rate, self.channels)
+
+    @staticmethod
+    def _add_layer(bus: np.ndarray, samples: np.ndarray, start: int,
+                   gain: float, fade_in: int, fade_out: int, fade_type: str = 'linear') -> None:
+        """Add samples to the bus at start, applying gain and fades chunk by chunk"""
+        total = len(samples)
+        end = min(start + total, len(bus))
+        if end <= start:
+            return
+
+        for position in range(0, end - start, MIX_CHUNK_FRAMES):
+            count = min(MIX_CHUNK_FRAMES, end - start - position)
+            chunk = samples[position:position + count]
+
+            gains = fade_gains(position, count, total, fade_in, fade_out, fade_type)
+            if gains is not None:
+                chunk = chunk * (gains[:, np.newaxis] * gain)
+            elif gain != 1.0:
+                chunk = chunk * gain
+
+            bus[start + position:start + position + count] += chunk
+
+    @staticmethod
+    def _add_ducked_layers(bus: np.ndarray, layers: List[Dict]) -> None:
+        """
+        Add layers whose gain follows a Ducker keyed on the bus, once every
+        other layer is in place; each chunk's gains are computed before any
+        ducked layer is added to it, so beds never duck each other
+        """
+        for position in range(0, len(bus), MIX_CHUNK_FRAMES):
+            count = min(MIX_CHUNK_FRAMES, len(bus) - position)
+
+            pending = []
+            for layer in layers:
+                samples, start = layer['samples'], layer['start']
+                first = max(position, start)
+                last = min(position + count, start + len(samples))
+                if last <= first:
+                    continue
+
+                local = first - start
+                gains = layer['ducker'].gains(bus[first:last])
+                gains *= layer['gain']
+                fades = fade_gains(local, last - first, len(samples),
+                                   layer['fade_in'], layer['fade_out'], layer['fade_type'])
+                if fades is not None:
+                    gains *= fades
+                pending.append((first, last, samples[local:local + last - first], gains))
+
+            for first, last, chunk, gains in pending:
+                bus[first:last] += chunk * gains[:, np.newaxis]
+
+    def mix(self, layers: List[Dict]) -> np.ndarray:
+        """
+        Mix layers into a float32 array of shape (frames, channels)
+
+        Args:
+            layers: List of layer dictionaries with keys:
+                - audio: AudioSegment, file path, AudioHandle, or float32
+                  sample array or LoopedSource at the bus rate
+                - start_time: Start time in seconds
+                - volume: Volume adjustment in dB
+                - fade_in: Fade in duration in seconds
+                - fade_out: Fade out duration in seconds
+                - fade_type: Fade curve, one of fades.FADE_TYPES (default linear)
+                - duck: Ducker settings (or True for defaults) to lower this layer
+                  while the other layers are active, e.g. a music bed under speech
+
+        Returns:
+            Mixed samples at self.sample_rate
+        """
+        # File paths are opened once, up front; handles decode only when added
+        sources = [
+            self.loader(layer['audio']) if isinstance(layer['audio'], str) else layer['audio']
+            for layer in layers
+        ]
+        formats = [self._layer_format(layer, audio) for layer, audio in zip(layers, sources)]
+        known = [fmt for fmt in formats if fmt]
+
+        sample_rate, channels = render_format(known)
+        if self.sample_rate is None:
+            self.sample_rate = sample_rate
+        if self.channels is None:
+            self.channels = channels
+        self.sample_width = max((fmt.get('sample_width', 2) for fmt in known), default=2)
+
+        # Size the bus once from every layer's end time
+        total_frames = 0
+        for layer, fmt in zip(layers, formats):
+            if fmt:
+                end_time = float(layer.get('start_time', 0)) + fmt['duration']
+                total_frames = max(total_frames, int(round(end_time * self.sample_rate)))
+
+        bus = self.scratch.allocate(total_frames, self.channels)
+        ducked = []
+
+        for layer, audio, fmt in zip(layers, sources, formats):
+            if not fmt:
+                continue
+
+            if isinstance(audio, LoopedSource):
+                samples = audio
+            elif isinstance(audio, np.ndarray):
+                samples = audio if audio.ndim > 1 else audio[:, np.newaxis]
+            elif hasattr(audio, 'stream_format'):
+                # Decoded straight to the bus format, once per source and window
+                samples = audio.samples(self.sample_rate, self.channels)
+                if samples is None:
+                    continue
+            else:
+                samples = self._to_bus_samples(audio)
+
+            placed = {
+                'samples': samples,
+                'start': int(round(float(layer.get('start_time', 0)) * self.sample_rate)),
+                'gain': db_to_gain(float(layer.get('volume', 0) or 0)),
+                'fade_in': int(float(layer.get('fade_in', 0) or 0) * self.sample_rate),
+                'fade_out': int(float(layer.get('fade_out', 0) or 0) * self.sample_rate),
+                'fade_type': layer.get('fade_type') or 'linear'
+            }
+
+            duck = layer.get('duck')
+            if duck:
+                placed['ducker'] = Ducker(self.sample_rate, **(duck if isinstance(duck, dict) else {}))
+                ducked.append(placed)
+                continue
+
+            self._add_layer(bus, placed['samples'], placed['start'], placed['gain'],
+                            placed['fade_in'], placed['fade_out'], placed['fade_type'])
+
+        # Ducked layers go last so the bus holds only their key signal
+        if ducked:
+            self._add_ducked_layers(bus, ducked)
+
+        return bus
+
+    def mix_to_segment(self, layers: List[Dict]) -> AudioSegment:
+        """Mix layers and convert the bus to an AudioSegment once at the end"""
+        bus = self.mix(layers)
+        return samples_to_segment(bus, self.sample_rate, self.sample_width)
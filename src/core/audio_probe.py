@@ -0,0 +1,124 @@
+"""
+Audio Probe
+Reads duration, sample rate and channel count from container and codec headers
+so callers never decode a whole file just to learn its length
+"""
+
+import os
+import json
+import shutil
+import subprocess
+from typing import Dict, Optional
+
+import soundfile as sf
+
+# Containers libsndfile can describe from its header parser alone
+SOUNDFILE_EXTENSIONS = {'.wav', '.flac', '.ogg', '.mp3', '.aif', '.aiff'}
+
+FFPROBE_TIMEOUT = 30  # seconds
+
+
+def _probe_soundfile(file_path: str) -> Optional[Dict]:
+    """Read stream parameters through libsndfile's header parser"""
+    info = sf.info(file_path)
+    if not info.samplerate or not info.frames:
+        return None
+
+    return {
+        'duration': info.frames / info.samplerate,
+        'sample_rate': int(info.samplerate),
+        'channels': int(info.channels),
+        'frames': int(info.frames),
+        'format': info.format.lower(),
+        'method': 'header'
+    }
+
+
+def _probe_ffprobe(file_path: str) -> Optional[Dict]:
+    """Read stream parameters with ffprobe, which only parses headers"""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        return None
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-print_format', 'json',
+         '-show_format', '-show_streams', '-select_streams', 'a:0', file_path],
+        capture_output=True,
+        timeout=FFPROBE_TIMEOUT
+    )
+    if result.returncode != 0:
+        return None
+
+    data = json.loads(result.stdout or b'{}')
+    streams = data.get('streams') or []
+    if not streams:
+        return None
+
+    stream = streams[0]
+    container = data.get('format', {})
+    duration = stream.get('duration') or container.get('duration')
+    sample_rate = stream.get('sample_rate')
+    if not duration or not sample_rate:
+        return None
+
+    sample_rate = int(sample_rate)
+    duration = float(duration)
+    return {
+        'duration': duration,
+        'sample_rate': sample_rate,
+        'channels': int(stream.get('channels') or 1),
+        'frames': int(round(duration * sample_rate)),
+        'format': (container.get('format_name') or '').split(',')[0],
+        'method': 'header'
+    }
+
+
+def _probe_decode(file_path: str) -> Optional[Dict]:
+    """Last resort for damaged headers: decode the file and measure it"""
+    import librosa
+
+    y, sr = librosa.load(file_path, sr=None, mono=False)
+    frames = y.shape[-1]
+    if not sr or not frames:
+        return None
+
+    return {
+        'duration': frames / sr,
+        'sample_rate': int(sr),
+        'channels': 1 if y.ndim == 1 else int(y.shape[0]),
+        'frames': int(frames),
+        'format': os.path.splitext(file_path)[1].lstrip('.').lower(),
+        'method': 'decode'
+    }
+
+
+def probe_audio(file_path: str) -> Optional[Dict]:
+    """
+    Get audio stream metadata without decoding the audio
+
+    Args:
+        file_path: Path to the audio file
+
+    Returns:
+        Dictionary with duration (seconds), sample_rate, channels, frames,
+        format and the method used ('header' or 'decode'), or None if the
+        file could not be read at all
+    """
+    file_path = str(file_path)
+    if not os.path.exists(file_path):
+        print(f"Audio file not found: {file_path}")
+        return None
+
+    probes = [_probe_ffprobe, _probe_decode]
+    if os.path.splitext(file_path)[1].lower() in SOUNDFILE_EXTENSIONS:
+        probes.insert(0, _probe_soundfile)
+
+    for probe in probes:
+        try:
+            info = probe(file_path)
+            if info:
+                return info
+        except Exception as e:
+            print(f"{probe.__name__} failed for {file_path}: {str(e)}")
+
+    return None
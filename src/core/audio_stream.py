@@ -0,0 +1,695 @@
+"""
+Audio Streaming
+Block-by-block decode, mix and encode through ffmpeg pipes so a render's peak
+memory does not grow with episode length
+"""
+
+import math
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment
+
+from .audio_mixer import LoopedSource, db_to_gain
+from .audio_probe import SOUNDFILE_EXTENSIONS, probe_audio
+from .dynamics import Ducker
+from .fades import apply_fades
+from .loudness import LoudnessMeter, LoudnessNormalizer, normalization_gain
+from .pcm_buffer import ScratchSpace
+from .resample import render_format
+
+BYTES_PER_SAMPLE = 4  # float32
+
+# Header durations can be a little short (e.g. MP3 encoder padding); whole-file
+# decodes reserve this much extra before having to grow their array
+DECODE_SLACK_SECONDS = 0.5
+
+
+class PcmDecoder:
+    """Reads interleaved float32 PCM from an ffmpeg decode pipe"""
+
+    def __init__(self,
+                 file_path: str,
+                 sample_rate: int,
+                 channels: int,
+                 start_time: float = 0.0,
+                 duration: Optional[float] = None,
+                 info: Optional[Dict] = None):
+        self.file_path = file_path
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+        # ffmpeg's mono upmix lowers each channel by 3 dB; duplicate mono
+        # ourselves so streamed and pydub-decoded sources sound the same
+        if info is None and channels > 1:
+            info = probe_audio(file_path)
+        self.upmix = bool(info and info['channels'] == 1)
+        self.decode_channels = 1 if self.upmix else channels
+
+        command = [AudioSegment.converter, '-v', 'error', '-nostdin']
+        if start_time > 0:
+            command += ['-ss', f'{start_time:.6f}']
+        command += ['-i', file_path]
+        if duration is not None:
+            command += ['-t', f'{duration:.6f}']
+        command += ['-vn', '-f', 'f32le', '-acodec', 'pcm_f32le',
+                    '-ac', str(self.decode_channels), '-ar', str(sample_rate), '-']
+
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.finished = False
+
+    @property
+    def failed(self) -> bool:
+        """Whether ffmpeg exited with an error after the stream ended (a cut-short decode)"""
+        return self.finished and self.process.returncode != 0
+
+    def _end(self) -> None:
+        """Reap ffmpeg once its output has ended, so its exit status is known"""
+        if not self.finished:
+            self.finished = True
+            self.process.wait()
+
+    def read(self, frames: int) -> np.ndarray:
+        """Read up to frames frames; a shorter array means the stream ended"""
+        buffer = np.empty((frames, self.decode_channels), dtype=np.float32)
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view):
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                self._end()
+                break
+            filled += count
+
+        samples = buffer[:filled // (BYTES_PER_SAMPLE * self.decode_channels)]
+        if self.upmix:
+            samples = np.repeat(samples, self.channels, axis=1)
+        return samples
+
+    def read_all(self, frames_hint: int) -> np.ndarray:
+        """
+        Read the rest of the stream into one array preallocated for
+        frames_hint frames; it only grows if the stream runs longer
+        """
+        frame_bytes = BYTES_PER_SAMPLE * self.decode_channels
+        buffer = np.empty((max(1, int(frames_hint)), self.decode_channels), dtype=np.float32)
+        filled = 0
+        while True:
+            view = memoryview(buffer).cast('B')
+            while filled < len(view):
+                count = self.process.stdout.readinto(view[filled:])
+                if not count:
+                    self._end()
+                    break
+                filled += count
+            if filled < len(view):
+                break
+            # Full but maybe not finished: grow by half and keep reading
+            grown = np.empty((len(buffer) + len(buffer) // 2 + 1, self.decode_channels), dtype=np.float32)
+            grown[:len(buffer)] = buffer
+            buffer = grown
+
+        samples = buffer[:filled // frame_bytes]
+        if self.upmix:
+            samples = np.repeat(samples, self.channels, axis=1)
+        return samples
+
+    def close(self) -> None:
+        """Release the decoder; a decode abandoned before the end of the stream is killed"""
+        if not self.finished and self.process.poll() is None:
+            self.process.kill()
+        self.process.stdout.close()
+        self.process.wait()
+
+
+def slice_window(samples: np.ndarray,
+                 sample_rate: int,
+                 start_time: float = 0.0,
+                 duration: Optional[float] = None) -> np.ndarray:
+    """View of the frames from start_time lasting duration seconds (or to the end)"""
+    start = min(int(round(max(0.0, start_time) * sample_rate)), len(samples))
+    if duration is None:
+        return samples[start:]
+    return samples[start:start + max(0, int(round(duration * sample_rate)))]
+
+
+def _read_soundfile(file_path: str, start_time: float, duration: Optional[float]) -> Optional[np.ndarray]:
+    """Read a window with libsndfile into one preallocated array, or None if it cannot decode the file"""
+    try:
+        with sf.SoundFile(file_path) as handle:
+            start = min(int(round(start_time * handle.samplerate)), handle.frames)
+            frames = handle.frames - start
+            if duration is not None:
+                frames = min(frames, int(round(duration * handle.samplerate)))
+            samples = np.empty((frames, handle.channels), dtype=np.float32)
+            if start:
+                handle.seek(start)
+            return handle.read(frames, dtype='float32', out=samples)
+    except Exception:
+        return None
+
+
+def decode_to_array(file_path: str,
+                    sample_rate: Optional[int] = None,
+                    channels: Optional[int] = None,
+                    start_time: float = 0.0,
+                    duration: Optional[float] = None,
+                    info: Optional[Dict] = None) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Decode a file, or a window of it, straight into one float32
+    (frames, channels) array sized from the headers, with no temporary file
+    or intermediate bytes copy
+
+    Formats libsndfile decodes itself are read in process when no rate or
+    channel change is asked for; everything else comes from ffmpeg's raw PCM pipe.
+
+    Args:
+        file_path: Audio file
+        sample_rate: Output rate (defaults to the source rate, with no resampling)
+        channels: Output channels (defaults to the source layout)
+        start_time: Seek position in seconds
+        duration: Seconds to decode from start_time (defaults to the rest of the file)
+        info: probe_audio result for the file, if already known
+
+    Returns:
+        (samples, sample_rate), or None if the file cannot be read
+    """
+    info = info or probe_audio(file_path)
+    if not info:
+        return None
+
+    sample_rate = int(sample_rate or info['sample_rate'])
+    channels = int(channels or info['channels'])
+    start_time = max(0.0, float(start_time))
+
+    if (os.path.splitext(file_path)[1].lower() in SOUNDFILE_EXTENSIONS
+            and sample_rate == info['sample_rate'] and channels == info['channels']):
+        samples = _read_soundfile(file_path, start_time, duration)
+        if samples is not None:
+            return samples, sample_rate
+
+    seconds = max(0.0, info['duration'] - start_time)
+    if duration is not None:
+        seconds = min(seconds, max(0.0, float(duration)))
+    else:
+        seconds += DECODE_SLACK_SECONDS
+    # One spare frame means an exact estimate never triggers a grow
+    frames_hint = int(math.ceil(seconds * sample_rate)) + 1
+
+    decoder = PcmDecoder(file_path, sample_rate, channels, start_time, duration, info=info)
+    try:
+        samples = decoder.read_all(frames_hint)
+    finally:
+        decoder.close()
+
+    # A decode that fails part way through is a failure, not a shorter file
+    if decoder.failed:
+        print(f"Error decoding {file_path}: ffmpeg exited with {decoder.process.returncode}")
+        return None
+    return samples, sample_rate
+
+
+# Staging files are named after the host and process that own them, so a
+# sweep can tell the files of a dead worker from those of a running one
+STAGING_PREFIX = '.encode_'
+
+
+def staging_prefix() -> str:
+    """Name prefix of this process's encoder staging files"""
+    return f"{STAGING_PREFIX}{socket.gethostname().replace('_', '-')}_{os.getpid()}_"
+
+
+class PcmEncoder:
+    """
+    Writes float32 PCM blocks into an ffmpeg encode pipe
+
+    Without an output path the encoder is started "warm": ffmpeg waits on
+    stdin and encodes into a staging file in work_dir, and attach() names the
+    file it is moved to once encoding finishes. Writing to a real file (not a
+    pipe) lets ffmpeg seek back and complete headers such as MP3's LAME tag.
+    """
+
+    def __init__(self,
+                 output_path: Optional[str],
+                 sample_rate: int,
+                 channels: int,
+                 format: str = 'mp3',
+                 bitrate: str = '192k',
+                 codec: Optional[str] = None,
+                 output_channels: Optional[int] = None,
+                 work_dir: Optional[str] = None):
+        self.output_path = output_path
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+        self.staging_path = None
+        if not output_path:
+            fd, self.staging_path = tempfile.mkstemp(prefix=staging_prefix(), suffix=f'.{format}', dir=work_dir)
+            os.close(fd)
+
+        command = [AudioSegment.converter, '-v', 'error', '-nostdin', '-y',
+                   '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', '-',
+                   '-f', format]
+        if codec:
+            command += ['-c:a', codec]
+        if output_channels:
+            command += ['-ac', str(output_channels)]
+        if bitrate:
+            command += ['-b:a', bitrate]
+        command.append(self.staging_path or output_path)
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def attach(self, output_path: str) -> None:
+        """Name the file a warm encoder's output is moved to when it closes"""
+        self.output_path = output_path
+
+    def write(self, samples: np.ndarray) -> None:
+        """Send a (frames, channels) float32 block to the encoder"""
+        self.process.stdin.write(memoryview(np.ascontiguousarray(samples, dtype=np.float32)).cast('B'))
+
+    def close(self) -> None:
+        """Flush the encoder and raise if ffmpeg reported an error; a failed encode leaves no staging file"""
+        try:
+            try:
+                self.process.stdin.close()
+            finally:
+                stderr = self.process.stderr.read()
+                self.process.stderr.close()
+            if self.process.wait() != 0:
+                raise RuntimeError(f"Encoding {self.output_path} failed: {stderr.decode(errors='replace')}")
+            if self.staging_path:
+                # A rename when work_dir shares the output's filesystem
+                shutil.move(self.staging_path, self.output_path)
+                self.staging_path = None
+        except Exception:
+            self._discard_staging()
+            raise
+
+    def abort(self) -> None:
+        """Stop the encoder without waiting for it to finish"""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self._discard_staging()
+
+    def _discard_staging(self) -> None:
+        """Remove a warm encoder's unfinished staging file"""
+        if self.staging_path:
+            try:
+                os.remove(self.staging_path)
+            except OSError:
+                pass
+            self.staging_path = None
+
+
+class EncoderFanout:
+    """
+    Feeds one PCM stream to several encoders in parallel
+
+    Each encoder is written from its own thread through a short queue, so a
+    slow encoder does not hold up the others and the mix runs only once.
+    """
+
+    QUEUE_BLOCKS = 2
+
+    def __init__(self, encoders: List[PcmEncoder]):
+        self.encoders = encoders
+        self._queues = [queue.Queue(maxsize=self.QUEUE_BLOCKS) for _ in encoders]
+        self._errors: List[Exception] = []
+        self._writers = [
+            threading.Thread(target=self._feed, args=(encoder, blocks), daemon=True)
+            for encoder, blocks in zip(encoders, self._queues)
+        ]
+        for writer in self._writers:
+            writer.start()
+
+    def _feed(self, encoder: PcmEncoder, blocks: queue.Queue) -> None:
+        """Writer thread: pass blocks to one encoder until the stream ends"""
+        failed = False
+        while True:
+            samples = blocks.get()
+            if samples is None:
+                return
+            if failed:
+                continue
+            try:
+                encoder.write(samples)
+            except Exception as e:
+                # Keep draining so the other encoders are never blocked
+                self._errors.append(e)
+                failed = True
+
+    def write(self, samples: np.ndarray) -> None:
+        """Send a block to every encoder (the block may be reused once this returns)"""
+        if self._errors:
+            raise self._errors[0]
+        shared = np.array(samples, dtype=np.float32)
+        for blocks in self._queues:
+            blocks.put(shared)
+
+    def _finish_writers(self) -> None:
+        """End every writer thread's stream and wait for it"""
+        for blocks in self._queues:
+            blocks.put(None)
+        for writer in self._writers:
+            writer.join()
+
+    def close(self) -> None:
+        """Flush every encoder; raises the first failure after all have finished"""
+        self._finish_writers()
+        errors = list(self._errors)
+        for encoder in self.encoders:
+            try:
+                if errors:
+                    encoder.abort()
+                else:
+                    encoder.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def abort(self) -> None:
+        """Stop every encoder without waiting for output"""
+        for encoder in self.encoders:
+            encoder.abort()
+        self._finish_writers()
+
+
+def open_encoder(outputs: List[Dict], sample_rate: int, channels: int, encoder_pool=None):
+    """
+    Start encoders for a list of outputs fed from one PCM stream
+
+    Args:
+        outputs: List of output dictionaries with keys:
+            - path: Output file
+            - format: ffmpeg output format (default mp3)
+            - bitrate: Encoder bitrate (default 192k)
+            - codec: ffmpeg audio codec (default: the format's own)
+            - channels: Output channel count, e.g. 1 for a mono downmix (default: as mixed)
+        sample_rate: Sample rate of the PCM stream
+        channels: Channel count of the PCM stream
+        encoder_pool: EncoderPool to take warm encoders from (optional)
+
+    Returns:
+        A PcmEncoder for a single output, otherwise an EncoderFanout
+    """
+    encoders = []
+    try:
+        for output in outputs:
+            options = {
+                'format': output.get('format', 'mp3'),
+                'bitrate': output.get('bitrate', '192k'),
+                'codec': output.get('codec'),
+                'output_channels': output.get('channels')
+            }
+            if encoder_pool:
+                encoders.append(encoder_pool.acquire(output['path'], sample_rate, channels, **options))
+            else:
+                encoders.append(PcmEncoder(output['path'], sample_rate, channels, **options))
+    except Exception:
+        for encoder in encoders:
+            encoder.abort()
+        raise
+
+    return encoders[0] if len(encoders) == 1 else EncoderFanout(encoders)
+
+
+class StreamSource:
+    """A file placed on the render timeline, decoded lazily while it is audible"""
+
+    def __init__(self, source: Dict, sample_rate: int, channels: int):
+        self.file_path = source['audio']
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.offset = float(source.get('offset', 0) or 0)
+        self.loop = bool(source.get('loop', False))
+        self.gain = db_to_gain(float(source.get('volume', 0) or 0))
+
+        self.start_frame = int(round(float(source.get('start_time', 0)) * sample_rate))
+        self.frames = int(round(float(source['duration']) * sample_rate))
+        self.end_frame = self.start_frame + self.frames
+        self.fade_in = int(float(source.get('fade_in', 0) or 0) * sample_rate)
+        self.fade_out = int(float(source.get('fade_out', 0) or 0) * sample_rate)
+        self.fade_type = source.get('fade_type') or 'linear'
+        self.loop_crossfade = int(float(source.get('loop_crossfade', 0) or 0) * sample_rate)
+
+        duck = source.get('duck')
+        self.ducker = Ducker(sample_rate, **(duck if isinstance(duck, dict) else {})) if duck else None
+
+        self.decoder = None
+        self.looped = None
+        self.position = 0
+
+    def _open(self) -> None:
+        """Start decoding from the source offset; loops are decoded once and repeated"""
+        self.decoder = PcmDecoder(self.file_path, self.sample_rate, self.channels,
+                                  start_time=self.offset,
+                                  duration=None if self.loop else self.frames / self.sample_rate)
+        if not self.loop:
+            return
+
+        # Hold exactly one loop in memory and read the bed from it by position
+        blocks = []
+        while True:
+            samples = self.decoder.read(self.sample_rate * 10)
+            if len(samples) == 0:
+                break
+            blocks.append(samples)
+        self._check()
+        self.close()
+
+        loop = np.concatenate(blocks) if blocks else np.zeros((0, self.channels), dtype=np.float32)
+        self.looped = LoopedSource(loop, self.frames, self.loop_crossfade)
+
+    def _read(self, count: int) -> np.ndarray:
+        """Read the next count frames of this source as a writable array"""
+        if self.looped is not None:
+            return np.array(self.looped[self.position:self.position + count])
+        samples = self.decoder.read(count)
+        self._check()
+        return samples
+
+    def _check(self) -> None:
+        """Fail the render if the source's decode ended with an error"""
+        if self.decoder.failed:
+            raise RuntimeError(f"Error decoding {self.file_path}: ffmpeg exited with {self.decoder.process.returncode}")
+
+    def read_into(self, block: np.ndarray, block_start: int) -> None:
+        """Add this source's samples for the block starting at block_start"""
+        first = max(self.start_frame, block_start)
+        last = min(self.end_frame, block_start + len(block))
+        if last <= first:
+            return
+
+        if self.decoder is None and self.looped is None:
+            self._open()
+
+        target = block[first - block_start:last - block_start]
+        samples = self._read(len(target))
+
+        apply_fades(samples, self.fade_in, self.fade_out, self.fade_type, self.position, self.frames)
+        if self.gain != 1.0:
+            samples *= self.gain
+
+        target[:len(samples)] += samples
+        self.position += len(target)
+
+        if last >= self.end_frame:
+            self.close()
+            self.looped = None
+
+    def close(self) -> None:
+        """Release the decoder process"""
+        if self.decoder:
+            self.decoder.close()
+            self.decoder = None
+
+
+class StreamingRenderer:
+    """Renders a timeline in fixed-size blocks straight into an encoder"""
+
+    def __init__(self,
+                 sample_rate: Optional[int] = None,
+                 channels: Optional[int] = None,
+                 block_seconds: float = 10.0,
+                 bus_processors: Optional[List] = None,
+                 loudness_target: Optional[float] = None,
+                 true_peak_limit: Optional[float] = -1.0,
+                 scratch_dir: Optional[str] = None,
+                 encoder_pool=None):
+        """
+        Args:
+            sample_rate: Output sample rate (defaults to render_format of the sources)
+            channels: Output channel count (defaults to render_format of the sources)
+            block_seconds: Length of each mixed block in seconds
+            bus_processors: Stateful block processors (e.g. a Compressor) applied
+                to each mixed block before encoding
+            loudness_target: Integrated loudness in LUFS to normalize to; the mix is
+                measured in a first pass into a memmap file and encoded in a second
+            true_peak_limit: True-peak ceiling in dBTP for normalized output (None disables)
+            scratch_dir: Directory for the normalization pass's memmap file
+            encoder_pool: EncoderPool to take a warm encoder from (optional)
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_seconds = block_seconds
+        self.bus_processors = bus_processors or []
+        self.loudness_target = loudness_target
+        self.true_peak_limit = true_peak_limit
+        self.scratch_dir = scratch_dir
+        self.encoder_pool = encoder_pool
+
+    def render(self,
+               sources: List[Dict],
+               output_path: Optional[str] = None,
+               format: str = 'mp3',
+               bitrate: str = '192k',
+               outputs: Optional[List[Dict]] = None) -> Dict:
+        """
+        Render sources to output_path
+
+        Args:
+            sources: List of source dictionaries with keys:
+                - audio: File path
+                - start_time: Timeline position in seconds
+                - duration: Seconds of the source to play
+                - offset: Seconds to skip at the start of the file
+                - volume: Volume adjustment in dB
+                - fade_in: Fade in duration in seconds
+                - fade_out: Fade out duration in seconds
+                - fade_type: Fade curve, one of fades.FADE_TYPES (default linear)
+                - loop: Repeat the file until duration is filled (music beds)
+                - loop_crossfade: Seconds blended across each loop seam
+                - duck: Ducker settings (or True for defaults) to lower this
+                  source while the other sources are active
+            output_path: Encoded output file
+            format: ffmpeg output format
+            bitrate: Encoder bitrate
+            outputs: Several outputs encoded from the one mix pass, as accepted by
+                open_encoder (replaces output_path, format and bitrate)
+
+        Returns:
+            Dictionary with the rendered duration and frame count, plus the
+            loudness measurement when normalizing
+        """
+        if self.sample_rate is None or self.channels is None:
+            # The same canonical bus format as the in-memory render
+            formats = [probe_audio(source['audio']) for source in sources]
+            sample_rate, channels = render_format(fmt for fmt in formats if fmt)
+            if self.sample_rate is None:
+                self.sample_rate = sample_rate
+            if self.channels is None:
+                self.channels = channels
+
+        streams = [StreamSource(source, self.sample_rate, self.channels) for source in sources]
+        streams.sort(key=lambda stream: stream.start_frame)
+        total_frames = max((stream.end_frame for stream in streams), default=0)
+        block_frames = max(1, int(self.block_seconds * self.sample_rate))
+
+        result = {
+            'duration': total_frames / self.sample_rate,
+            'frames': total_frames
+        }
+
+        if outputs is None:
+            outputs = [{'path': output_path, 'format': format, 'bitrate': bitrate}]
+        encoder = open_encoder(outputs, self.sample_rate, self.channels, self.encoder_pool)
+        try:
+            if self.loudness_target is None:
+                for block in self._mix_blocks(streams, total_frames, block_frames):
+                    np.clip(block, -1.0, 1.0, out=block)
+                    encoder.write(block)
+            else:
+                result['loudness'] = self._normalize_blocks(streams, total_frames, block_frames, encoder)
+
+            encoder.close()
+        except Exception:
+            encoder.abort()
+            raise
+        finally:
+            for stream in streams:
+                stream.close()
+
+        return result
+
+    def _mix_blocks(self, streams: List[StreamSource], total_frames: int, block_frames: int):
+        """Yield each mixed and bus-processed block in timeline order (the buffer is reused)"""
+        block = np.zeros((block_frames, self.channels), dtype=np.float32)
+        keyed = [stream for stream in streams if not stream.ducker]
+        ducked = [stream for stream in streams if stream.ducker]
+        beds = np.zeros((len(ducked), block_frames, self.channels), dtype=np.float32)
+
+        for block_start in range(0, total_frames, block_frames):
+            frames = min(block_frames, total_frames - block_start)
+            current = block[:frames]
+            current.fill(0.0)
+
+            for stream in keyed:
+                if stream.start_frame >= block_start + frames:
+                    break
+                stream.read_into(current, block_start)
+
+            # Ducked sources follow the envelope of everything else in the block
+            pending = []
+            for stream, bed in zip(ducked, beds):
+                active = slice(max(stream.start_frame, block_start) - block_start,
+                               min(stream.end_frame, block_start + frames) - block_start)
+                if active.stop <= active.start:
+                    continue
+                bed[active].fill(0.0)
+                stream.read_into(bed[:frames], block_start)
+                bed[active] *= stream.ducker.gains(current[active])[:, np.newaxis]
+                pending.append((active, bed))
+
+            for active, bed in pending:
+                current[active] += bed[active]
+
+            for processor in self.bus_processors:
+                processor.process(current, out=current)
+
+            yield current
+
+    def _normalize_blocks(self,
+                          streams: List[StreamSource],
+                          total_frames: int,
+                          block_frames: int,
+                          encoder) -> Dict:
+        """Two-pass loudness normalization: meter the mix into a memmap, then gain, limit and encode"""
+        meter = LoudnessMeter(self.sample_rate, self.channels)
+
+        with ScratchSpace(self.scratch_dir, use_memmap=True) as scratch:
+            mixed = scratch.allocate(total_frames, self.channels)
+
+            position = 0
+            for block in self._mix_blocks(streams, total_frames, block_frames):
+                meter.process(block)
+                mixed[position:position + len(block)] = block
+                position += len(block)
+
+            measured = meter.integrated_loudness()
+            gain_db = normalization_gain(measured, self.loudness_target)
+            normalizer = LoudnessNormalizer(self.sample_rate, gain_db, self.true_peak_limit)
+
+            block = np.empty((block_frames, self.channels), dtype=np.float32)
+            for start in range(0, total_frames, block_frames):
+                current = block[:min(block_frames, total_frames - start)]
+                normalizer.process(mixed[start:start + len(current)], out=current)
+                np.clip(current, -1.0, 1.0, out=current)
+                encoder.write(current)
+
+        return {
+            'measured_lufs': measured,
+            'measured_true_peak': meter.true_peak_db(),
+            'target_lufs': self.loudness_target,
+            'gain_db': gain_db
+        }
@@ -0,0 +1,200 @@
+"""
+Dynamics Processing
+Vectorized feed-forward compressor and sidechain ducker that run block by
+block, so the same instance can process a whole file in memory or a streaming render
+"""
+
+from typing import Optional
+
+import numpy as np
+from scipy.signal import lfilter, resample_poly
+
+EPSILON = 1e-10
+TRUE_PEAK_OVERSAMPLING = 4
+
+
+def time_constant(milliseconds: float, sample_rate: int) -> float:
+    """One-pole smoothing coefficient for a time constant in milliseconds"""
+    if milliseconds <= 0:
+        return 0.0
+    return float(np.exp(-1.0 / (milliseconds * 0.001 * sample_rate)))
+
+
+def true_peak(samples: np.ndarray) -> np.ndarray:
+    """Per-frame channel-linked true peak of a (frames, channels) block via 4x oversampling"""
+    # Extrapolating past the block edges keeps the filter from ringing on a false step
+    oversampled = resample_poly(samples, TRUE_PEAK_OVERSAMPLING, 1, axis=0, padtype='line')
+    peaks = np.abs(oversampled).reshape(len(samples), TRUE_PEAK_OVERSAMPLING, -1).max(axis=(1, 2))
+    return np.maximum(peaks, np.max(np.abs(samples), axis=1))
+
+
+class Compressor:
+    """
+    Feed-forward compressor with an RMS, peak or true-peak detector, soft knee and makeup gain
+
+    Gain reduction recovers at a constant dB rate (release) computed with a
+    running maximum, then a one-pole filter shapes the attack, so every stage
+    is a NumPy/SciPy vector operation with its state carried between blocks.
+    """
+
+    def __init__(self,
+                 sample_rate: int,
+                 threshold: float = -20.0,
+                 ratio: float = 4.0,
+                 attack_ms: float = 10.0,
+                 release_ms: float = 150.0,
+                 knee_db: float = 6.0,
+                 makeup_db: float = 0.0,
+                 detector: str = 'rms',
+                 rms_window_ms: float = 10.0):
+        """
+        Args:
+            sample_rate: Sample rate of the audio to process
+            threshold: Level in dBFS above which gain is reduced
+            ratio: Input/output ratio above the threshold
+            attack_ms: Time constant for gain reduction to engage
+            release_ms: Time for 10 dB of gain reduction to recover
+            knee_db: Width of the soft knee around the threshold
+            makeup_db: Gain applied after compression
+            detector: 'rms', 'peak' or 'true_peak' (4x oversampled) level detection
+            rms_window_ms: Averaging time of the RMS detector
+        """
+        if ratio < 1:
+            raise ValueError("Compression ratio must be at least 1")
+        if detector not in ('rms', 'peak', 'true_peak'):
+            raise ValueError("Detector must be 'rms', 'peak' or 'true_peak'")
+
+        self.sample_rate = sample_rate
+        self.threshold = float(threshold)
+        self.slope = 1.0 - 1.0 / float(ratio)
+        self.knee_db = max(0.0, float(knee_db))
+        self.makeup_db = float(makeup_db)
+        self.detector = detector
+
+        self.release_per_sample = 10.0 / max(release_ms * 0.001 * sample_rate, 1.0)
+        attack = time_constant(attack_ms, sample_rate)
+        self.attack_b = np.array([1.0 - attack])
+        self.attack_a = np.array([1.0, -attack])
+        rms = time_constant(rms_window_ms, sample_rate)
+        self.rms_b = np.array([1.0 - rms])
+        self.rms_a = np.array([1.0, -rms])
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear detector and gain state before processing a new stream"""
+        self._rms_state = np.zeros(1)
+        self._attack_state = np.zeros(1)
+        self._held = 0.0
+
+    def _level_db(self, samples: np.ndarray) -> np.ndarray:
+        """Channel-linked detector level in dBFS for each frame"""
+        if self.detector == 'peak':
+            peak = np.max(np.abs(samples), axis=1)
+            return 20.0 * np.log10(peak + EPSILON)
+        if self.detector == 'true_peak':
+            return 20.0 * np.log10(true_peak(samples) + EPSILON)
+
+        power = np.mean(np.square(samples, dtype=np.float64), axis=1)
+        power, self._rms_state = lfilter(self.rms_b, self.rms_a, power, zi=self._rms_state)
+        return 10.0 * np.log10(power + EPSILON)
+
+    def _gain_reduction(self, level_db: np.ndarray) -> np.ndarray:
+        """Static gain computer: dB of reduction for each level, with a soft knee"""
+        over = level_db - self.threshold
+        reduction = np.where(over > 0, self.slope * over, 0.0)
+
+        if self.knee_db > 0:
+            half = self.knee_db / 2.0
+            in_knee = np.abs(over) <= half
+            knee = self.slope * np.square(over + half) / (2.0 * self.knee_db)
+            reduction = np.where(in_knee, knee, reduction)
+        return reduction
+
+    def _smooth(self, reduction: np.ndarray) -> np.ndarray:
+        """Constant-rate release via a running maximum, then one-pole attack"""
+        ramp = self.release_per_sample * np.arange(len(reduction), dtype=np.float64)
+        held = np.maximum.accumulate(reduction + ramp) - ramp
+        # Gain reduction carried over from the previous block keeps releasing
+        np.maximum(held, self._held - self.release_per_sample - ramp, out=held)
+        self._held = float(held[-1])
+
+        smoothed, self._attack_state = lfilter(self.attack_b, self.attack_a, held, zi=self._attack_state)
+        return smoothed
+
+    def gain_db(self, samples: np.ndarray) -> np.ndarray:
+        """Gain in dB (reduction plus makeup) for each frame of a block"""
+        reduction = self._smooth(self._gain_reduction(self._level_db(samples)))
+        return self.makeup_db - reduction
+
+    def process(self, samples: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compress a float32 (frames, channels) block
+
+        Args:
+            samples: Input block; consecutive calls continue the same stream
+            out: Output array (may be samples itself for in-place processing)
+
+        Returns:
+            The compressed block
+        """
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if len(samples) == 0:
+            return samples if out is None else out
+
+        gain = np.power(10.0, self.gain_db(samples) / 20.0).astype(np.float32)
+        if out is None:
+            out = np.empty_like(samples, dtype=np.float32)
+        np.multiply(samples, gain[:, np.newaxis], out=out)
+        return out
+
+
+class Ducker(Compressor):
+    """
+    Sidechain ducker: lowers a bed (e.g. music) by a fixed depth while a key
+    signal (e.g. speech) is active
+
+    The key's RMS envelope is compared with a threshold, and the resulting
+    reduction is smoothed with the compressor's attack and constant-rate
+    release, so pauses between words do not pump the bed.
+    """
+
+    def __init__(self,
+                 sample_rate: int,
+                 threshold: float = -40.0,
+                 depth_db: float = 12.0,
+                 attack_ms: float = 50.0,
+                 release_ms: float = 400.0,
+                 rms_window_ms: float = 30.0):
+        """
+        Args:
+            sample_rate: Sample rate of the key and bed
+            threshold: Key level in dBFS above which the key counts as active
+            depth_db: Reduction applied to the bed while the key is active
+            attack_ms: Time constant for the bed to duck
+            release_ms: Time for 10 dB of ducking to recover once the key stops
+            rms_window_ms: Averaging time of the key envelope
+        """
+        super().__init__(
+            sample_rate,
+            threshold=threshold,
+            attack_ms=attack_ms,
+            release_ms=release_ms,
+            knee_db=0,
+            detector='rms',
+            rms_window_ms=rms_window_ms
+        )
+        self.depth_db = max(0.0, float(depth_db))
+
+    def _gain_reduction(self, level_db: np.ndarray) -> np.ndarray:
+        """Full depth wherever the key is active"""
+        return np.where(level_db > self.threshold, self.depth_db, 0.0)
+
+    def gains(self, key: np.ndarray) -> np.ndarray:
+        """Linear bed gain for each frame of a (frames, channels) key block"""
+        if key.ndim == 1:
+            key = key[:, np.newaxis]
+        if len(key) == 0:
+            return np.ones(0, dtype=np.float32)
+        return np.power(10.0, self.gain_db(key) / 20.0).astype(np.float32)
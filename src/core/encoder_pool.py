@@ -0,0 +1,164 @@
+"""
+Encoder Pool
+Keeps pre-started ffmpeg encoders waiting on stdin, so an export only has to
+pipe PCM into a process that is already running
+"""
+
+import atexit
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .audio_stream import STAGING_PREFIX, PcmEncoder
+
+DEFAULT_POOL_SIZE = 2
+
+# Staging files without an owner in their name are removed once this old
+STALE_STAGING_SECONDS = 24 * 3600
+
+_STAGING_NAME = re.compile(re.escape(STAGING_PREFIX) + r'(?P<host>[^_]+)_(?P<pid>\d+)_')
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this id runs on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_staging(work_dir: str) -> int:
+    """
+    Remove the staging files of encoders whose process has died (a worker
+    killed mid-render); files of other hosts' running workers are kept
+
+    Returns:
+        Number of files removed
+    """
+    host = socket.gethostname().replace('_', '-')
+    removed = 0
+    try:
+        names = os.listdir(work_dir)
+    except OSError:
+        return 0
+
+    for name in names:
+        if not name.startswith(STAGING_PREFIX):
+            continue
+        path = os.path.join(work_dir, name)
+        match = _STAGING_NAME.match(name)
+        try:
+            if match:
+                if match.group('host') != host or _process_alive(int(match.group('pid'))):
+                    continue
+            elif time.time() - os.path.getmtime(path) < STALE_STAGING_SECONDS:
+                continue
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+EncoderKey = Tuple[int, int, str, str, Optional[str], Optional[int]]
+
+
+class EncoderPool:
+    """
+    Warm encoders per output format
+
+    An ffmpeg process encodes exactly one stream, so each acquire hands out a
+    warm encoder and starts its replacement for the next export.
+    """
+
+    def __init__(self, size: int = None, work_dir: str = None):
+        """
+        Args:
+            size: Warm encoders kept per format (defaults to ENCODER_POOL_SIZE or 2)
+            work_dir: Directory for staging files (defaults to ENCODER_WORK_DIR or the
+                system temp directory); on the outputs' filesystem the final move is a rename
+        """
+        if size is None:
+            size = int(os.getenv('ENCODER_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.size = max(0, size)
+        self.work_dir = work_dir or os.getenv('ENCODER_WORK_DIR') or tempfile.gettempdir()
+        os.makedirs(self.work_dir, exist_ok=True)
+        sweep_staging(self.work_dir)
+        self._idle: Dict[EncoderKey, List[PcmEncoder]] = defaultdict(list)
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _spawn(self, key: EncoderKey) -> PcmEncoder:
+        """Start an encoder that waits on stdin until it is attached to a file"""
+        sample_rate, channels, format, bitrate, codec, output_channels = key
+        return PcmEncoder(None, sample_rate, channels, format, bitrate, codec, output_channels, self.work_dir)
+
+    @staticmethod
+    def _key(sample_rate: int, channels: int, format: str, bitrate: str,
+             codec: Optional[str], output_channels: Optional[int]) -> EncoderKey:
+        """Pool key: encoders are only interchangeable for identical settings"""
+        return (int(sample_rate), int(channels), format, bitrate or '', codec,
+                int(output_channels) if output_channels else None)
+
+    def warm(self,
+             sample_rate: int,
+             channels: int,
+             format: str = 'mp3',
+             bitrate: str = '192k',
+             codec: Optional[str] = None,
+             output_channels: Optional[int] = None) -> None:
+        """Start encoders for a format ahead of its first export"""
+        key = self._key(sample_rate, channels, format, bitrate, codec, output_channels)
+        with self._lock:
+            idle = self._idle[key]
+            # Encoders that died while idle (e.g. killed by the host) are dropped
+            idle[:] = [encoder for encoder in idle if encoder.process.poll() is None]
+            while len(idle) < self.size:
+                idle.append(self._spawn(key))
+
+    def acquire(self,
+                output_path: str,
+                sample_rate: int,
+                channels: int,
+                format: str = 'mp3',
+                bitrate: str = '192k',
+                codec: Optional[str] = None,
+                output_channels: Optional[int] = None) -> PcmEncoder:
+        """
+        Get an encoder writing to output_path
+
+        The caller owns the returned encoder and must close() or abort() it.
+        """
+        key = self._key(sample_rate, channels, format, bitrate, codec, output_channels)
+        encoder = None
+        with self._lock:
+            idle = self._idle[key]
+            while idle and encoder is None:
+                candidate = idle.pop()
+                if candidate.process.poll() is None:
+                    encoder = candidate
+                else:
+                    candidate.abort()
+
+        if encoder is None:
+            encoder = self._spawn(key)
+        encoder.attach(output_path)
+
+        if self.size:
+            self.warm(sample_rate, channels, format, bitrate, codec, output_channels)
+        return encoder
+
+    def close(self) -> None:
+        """Stop every idle encoder"""
+        with self._lock:
+            idle = [encoder for encoders in self._idle.values() for encoder in encoders]
+            self._idle.clear()
+        for encoder in idle:
+            encoder.abort()
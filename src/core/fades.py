@@ -0,0 +1,115 @@
+"""
+Fades
+Sample-accurate fade curves shared through a lookup-table cache, applied as
+in-place multiplies over the faded regions of a buffer
+"""
+
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+FADE_TYPES = ('linear', 'exponential', 'logarithmic', 'equal_power')
+
+# Curves are small (a 3 s fade at 48 kHz is under 600 KB) and recur across episodes
+FADE_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=FADE_CACHE_SIZE)
+def fade_curve(fade_type: str, length: int) -> np.ndarray:
+    """
+    Rising fade gains for length frames (frame i gets shape(i / length))
+
+    Arrays are shared between callers and therefore read-only; a fade out is
+    the same curve reversed.
+    """
+    position = np.arange(length, dtype=np.float64) / max(length, 1)
+
+    if fade_type == 'exponential':
+        curve = np.square(position)
+    elif fade_type == 'logarithmic':
+        curve = np.log1p((np.e - 1.0) * position)
+    elif fade_type == 'equal_power':
+        curve = np.sin(position * (np.pi / 2.0))
+    elif fade_type == 'linear':
+        curve = position
+    else:
+        raise ValueError(f"Unknown fade type '{fade_type}', expected one of {', '.join(FADE_TYPES)}")
+
+    curve = curve.astype(np.float32)
+    curve.flags.writeable = False
+    return curve
+
+
+def _fade_regions(position: int, count: int, total: int, fade_in: int, fade_out: int):
+    """Slices of the block and of the rising curve covered by each fade"""
+    regions = []
+    if fade_in > 0 and position < fade_in:
+        end = min(fade_in, position + count)
+        regions.append(('in', slice(0, end - position), slice(position, end)))
+
+    fade_start = total - fade_out
+    if fade_out > 0 and position + count > fade_start:
+        first = max(fade_start, position)
+        end = min(total, position + count)
+        if end > first:
+            # Frame index i sits (total - 1 - i) frames before the end of the source
+            regions.append(('out', slice(first - position, end - position), slice(total - end, total - first)))
+    return regions
+
+
+def apply_fades(samples: np.ndarray,
+                fade_in: int,
+                fade_out: int,
+                fade_type: str = 'linear',
+                position: int = 0,
+                total: Optional[int] = None) -> np.ndarray:
+    """
+    Fade a writable (frames, channels) block in place
+
+    Args:
+        samples: Block holding frames [position, position + len(samples)) of the source
+        fade_in: Fade in length in frames
+        fade_out: Fade out length in frames
+        fade_type: One of FADE_TYPES
+        position: Frame offset of the block within the source
+        total: Source length in frames (defaults to the block's end)
+
+    Returns:
+        samples, for chaining
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    if total is None:
+        total = position + len(samples)
+
+    for direction, block_slice, curve_slice in _fade_regions(position, len(samples), total, fade_in, fade_out):
+        curve = fade_curve(fade_type, fade_in if direction == 'in' else fade_out)[curve_slice]
+        if direction == 'out':
+            curve = curve[::-1]
+        samples[block_slice] *= curve[:, np.newaxis]
+    return samples
+
+
+def fade_gains(position: int,
+               count: int,
+               total: int,
+               fade_in: int,
+               fade_out: int,
+               fade_type: str = 'linear') -> Optional[np.ndarray]:
+    """
+    Fade gains for frames [position, position + count) of a source that is
+    total frames long, or None when no fade touches that range
+    """
+    regions = _fade_regions(position, count, total, fade_in, fade_out)
+    if not regions:
+        return None
+
+    gains = np.ones(count, dtype=np.float32)
+    for direction, block_slice, curve_slice in regions:
+        curve = fade_curve(fade_type, fade_in if direction == 'in' else fade_out)[curve_slice]
+        if direction == 'out':
+            curve = curve[::-1]
+        # Overlapping fades on a short source multiply, as apply_fades does
+        gains[block_slice] *= curve
+    return gains
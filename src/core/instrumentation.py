@@ -0,0 +1,207 @@
+"""
+Render Instrumentation
+Records timed spans for each processing stage (wall and CPU time, bytes
+read and written, peak memory) and hands them to pluggable hooks
+"""
+
+import logging
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SpanHook = Callable[[Dict], None]
+ProgressHook = Callable[[int, str], None]
+
+# Hooks registered here see the spans of every render in the process
+_global_hooks: List[SpanHook] = []
+_global_hooks_lock = threading.Lock()
+
+# Renders with a span open; the counters spans read are process-wide, so
+# spans of renders that overlap (parallel batch renders) are flagged
+_open_renders: List['Instrumentation'] = []
+_open_renders_lock = threading.Lock()
+
+
+def register_span_hook(hook: SpanHook) -> None:
+    """Call hook with every finished span, e.g. to export them to a metrics system"""
+    with _global_hooks_lock:
+        if hook not in _global_hooks:
+            _global_hooks.append(hook)
+
+
+def unregister_span_hook(hook: SpanHook) -> None:
+    """Stop calling a hook added with register_span_hook"""
+    with _global_hooks_lock:
+        if hook in _global_hooks:
+            _global_hooks.remove(hook)
+
+
+def log_span(span: Dict) -> None:
+    """Span hook that writes one log line per stage"""
+    logger.info(
+        f"{span['name']}: wall {span['wall_seconds']:.3f}s cpu {span['cpu_seconds']:.3f}s "
+        f"ffmpeg cpu {span['child_cpu_seconds']:.3f}s read {span['bytes_read'] or 0} B "
+        f"written {span['bytes_written'] or 0} B peak {span['peak_rss_mb']:.1f} MB"
+        f"{' (overlapping renders)' if span.get('overlapping') else ''}"
+    )
+
+
+def _io_counters() -> Optional[Dict[str, int]]:
+    """Bytes this process has read and written, pipes included (Linux only)"""
+    try:
+        with open('/proc/self/io') as handle:
+            counters = dict(line.split(':', 1) for line in handle)
+        return {'read': int(counters['rchar']), 'written': int(counters['wchar'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss() -> None:
+    """Restart the kernel's peak RSS tracking for this process (Linux 4.0+)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as handle:
+            handle.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS since the last reset, or for the whole process where resets are unsupported"""
+    try:
+        with open('/proc/self/status') as handle:
+            for line in handle:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds(who: int) -> float:
+    """User plus system CPU time from getrusage"""
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Instrumentation:
+    """
+    Collects the spans of one render
+
+    CPU time covers every thread of the process, so decode workers count
+    towards the stage that waits for them; ffmpeg's CPU is reported
+    separately once its processes exit. CPU, I/O and peak memory are read
+    from process-wide counters, so spans that ran while another render in
+    the same process had a span open are marked overlapping: their figures
+    include the other render's work.
+    """
+
+    def __init__(self,
+                 hooks: Optional[List[SpanHook]] = None,
+                 on_progress: Optional[ProgressHook] = None):
+        """
+        Args:
+            hooks: Called with each finished span, in addition to the global hooks
+            on_progress: Called with (percent, stage name) when a stage starts
+        """
+        self.hooks = list(hooks or [])
+        self.on_progress = on_progress
+        self.spans: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._stack: List[Dict] = []
+
+    @contextmanager
+    def span(self, name: str, progress: Optional[int] = None, **attributes) -> Iterator[Dict]:
+        """
+        Measure a stage; the yielded span dictionary can be given extra attributes
+
+        Args:
+            name: Stage name
+            progress: Overall progress in percent when the stage starts
+            **attributes: Extra fields stored on the span
+        """
+        if progress is not None and self.on_progress:
+            try:
+                self.on_progress(int(progress), name)
+            except Exception as e:
+                logger.warning(f"Progress hook failed for {name}: {str(e)}")
+
+        span = {'name': name, 'parent': self._stack[-1]['name'] if self._stack else None, **attributes}
+        if self._stack:
+            # Resetting the peak for this span must not lose the enclosing span's peak so far
+            self._note_peak(self._stack[-1], _peak_rss_mb())
+        self._stack.append(span)
+        with _open_renders_lock:
+            others = [render for render in _open_renders if render is not self]
+            if self not in _open_renders:
+                _open_renders.append(self)
+            for render in others + ([self] if others else []):
+                render._mark_overlapping()
+        if not others:
+            # Another render's spans would lose their peak if it were reset now
+            _reset_peak_rss()
+        io_start = _io_counters()
+        cpu_start = _cpu_seconds(resource.RUSAGE_SELF)
+        children_start = _cpu_seconds(resource.RUSAGE_CHILDREN)
+        wall_start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            wall_end = time.perf_counter()
+            io_end = _io_counters()
+            peak = max(_peak_rss_mb(), span.pop('_peak_rss_mb', 0.0))
+            self._stack.pop()
+            if self._stack:
+                self._note_peak(self._stack[-1], peak)
+            else:
+                with _open_renders_lock:
+                    if self in _open_renders:
+                        _open_renders.remove(self)
+
+            span.update({
+                'started_at': round(wall_start - self._origin, 6),
+                'wall_seconds': wall_end - wall_start,
+                'cpu_seconds': _cpu_seconds(resource.RUSAGE_SELF) - cpu_start,
+                'child_cpu_seconds': _cpu_seconds(resource.RUSAGE_CHILDREN) - children_start,
+                'bytes_read': io_end['read'] - io_start['read'] if io_start and io_end else None,
+                'bytes_written': io_end['written'] - io_start['written'] if io_start and io_end else None,
+                'peak_rss_mb': peak
+            })
+            self.spans.append(span)
+            self._emit(span)
+
+    def _mark_overlapping(self) -> None:
+        """Flag every open span; the caller holds _open_renders_lock"""
+        for span in list(self._stack):
+            span['overlapping'] = True
+
+    @staticmethod
+    def _note_peak(span: Dict, peak: float) -> None:
+        """Remember a peak seen while a span is open"""
+        span['_peak_rss_mb'] = max(span.get('_peak_rss_mb', 0.0), peak)
+
+    def _emit(self, span: Dict) -> None:
+        """Pass a finished span to every hook; a failing hook never fails the render"""
+        with _global_hooks_lock:
+            hooks = self.hooks + _global_hooks
+        for hook in hooks:
+            try:
+                hook(span)
+            except Exception as e:
+                logger.warning(f"Span hook failed for {span['name']}: {str(e)}")
+
+    def summary(self) -> Dict:
+        """
+        Spans in completion order, the total wall time, and whether any span
+        overlapped another render, ready to store as JSON
+        """
+        top_level = [span for span in self.spans if span['parent'] is None]
+        return {
+            'spans': list(self.spans),
+            'wall_seconds': sum(span['wall_seconds'] for span in top_level),
+            'overlapping': any(span.get('overlapping') for span in self.spans)
+        }
@@ -0,0 +1,203 @@
+"""
+Loudness
+ITU-R BS.1770 / EBU R128 integrated loudness metering with K-weighting and
+gating, plus two-pass normalization that never needs the whole signal in memory
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+from .dynamics import Compressor, true_peak
+
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU below the absolute-gated loudness
+SUB_BLOCK_SECONDS = 0.1  # 400 ms gating blocks overlap by 75%, i.e. step 100 ms
+SUB_BLOCKS_PER_GATE = 4
+DEFAULT_BLOCK_SECONDS = 10.0
+
+
+def k_weighting_filters(sample_rate: int) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+    """BS.1770 pre-filter (high shelf) and RLB high-pass biquads for any sample rate"""
+    # High shelf modelling the acoustic effect of the head
+    gain_db, f0, q = 3.999843853973347, 1681.974450955533, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf_b = np.array([(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0])
+    shelf_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    # Revised low-frequency B-weighting high-pass
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    highpass_b = np.array([1.0, -2.0, 1.0])
+    highpass_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    return (shelf_b, shelf_a), (highpass_b, highpass_a)
+
+
+def channel_weights(channels: int) -> np.ndarray:
+    """BS.1770 channel weights (5.1 layouts weight the surrounds and drop the LFE)"""
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+def to_db(value: float) -> float:
+    """Linear amplitude to dB, with silence as -inf"""
+    return float(20.0 * np.log10(value)) if value > 0 else float('-inf')
+
+
+class LoudnessMeter:
+    """Streaming integrated-loudness and true-peak meter; feed blocks in order"""
+
+    def __init__(self, sample_rate: int, channels: int):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.weights = channel_weights(channels)
+        self.sub_block_frames = int(round(SUB_BLOCK_SECONDS * sample_rate))
+
+        (self.shelf_b, self.shelf_a), (self.highpass_b, self.highpass_a) = k_weighting_filters(sample_rate)
+        self._shelf_state = np.zeros((2, channels))
+        self._highpass_state = np.zeros((2, channels))
+
+        # Mean-square energy of each completed 100 ms sub-block, per channel
+        self._sub_blocks = []
+        self._partial_sum = np.zeros(channels)
+        self._partial_count = 0
+        self._peak = 0.0
+
+    def process(self, samples: np.ndarray) -> None:
+        """Meter the next (frames, channels) block"""
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if len(samples) == 0:
+            return
+
+        self._peak = max(self._peak, float(np.max(true_peak(samples))))
+
+        weighted, self._shelf_state = lfilter(self.shelf_b, self.shelf_a, samples, axis=0, zi=self._shelf_state)
+        weighted, self._highpass_state = lfilter(self.highpass_b, self.highpass_a, weighted, axis=0,
+                                                 zi=self._highpass_state)
+        power = np.square(weighted)
+
+        # Complete the sub-block left over from the previous call
+        position = 0
+        if self._partial_count:
+            take = min(self.sub_block_frames - self._partial_count, len(power))
+            self._partial_sum += power[:take].sum(axis=0)
+            self._partial_count += take
+            position = take
+            if self._partial_count == self.sub_block_frames:
+                self._sub_blocks.append(self._partial_sum / self.sub_block_frames)
+                self._partial_sum = np.zeros(self.channels)
+                self._partial_count = 0
+
+        # Whole sub-blocks in one reshape
+        whole = (len(power) - position) // self.sub_block_frames
+        if whole:
+            end = position + whole * self.sub_block_frames
+            blocks = power[position:end].reshape(whole, self.sub_block_frames, self.channels)
+            self._sub_blocks.extend(blocks.mean(axis=1))
+            position = end
+
+        if position < len(power):
+            self._partial_sum += power[position:].sum(axis=0)
+            self._partial_count += len(power) - position
+
+    def integrated_loudness(self) -> float:
+        """Gated integrated loudness in LUFS (-inf for silence or very short input)"""
+        if len(self._sub_blocks) < SUB_BLOCKS_PER_GATE:
+            return float('-inf')
+
+        sub_blocks = np.asarray(self._sub_blocks)
+        cumulative = np.concatenate([np.zeros((1, self.channels)), np.cumsum(sub_blocks, axis=0)])
+        gates = (cumulative[SUB_BLOCKS_PER_GATE:] - cumulative[:-SUB_BLOCKS_PER_GATE]) / SUB_BLOCKS_PER_GATE
+
+        weighted = gates @ self.weights
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10.0 * np.log10(weighted)
+
+        above_absolute = block_loudness > ABSOLUTE_GATE
+        if not np.any(above_absolute):
+            return float('-inf')
+
+        relative_gate = -0.691 + 10.0 * np.log10(np.mean(weighted[above_absolute])) + RELATIVE_GATE
+        gated = above_absolute & (block_loudness > relative_gate)
+        return float(-0.691 + 10.0 * np.log10(np.mean(weighted[gated])))
+
+    def true_peak_db(self) -> float:
+        """Highest true peak seen so far in dBTP"""
+        return to_db(self._peak)
+
+
+class LoudnessNormalizer:
+    """Second pass: applies a fixed gain and an optional true-peak limiter block by block"""
+
+    def __init__(self, sample_rate: int, gain_db: float, true_peak_limit: Optional[float] = -1.0):
+        self.gain = float(10 ** (gain_db / 20.0))
+        self.limiter = None
+        if true_peak_limit is not None:
+            self.limiter = Compressor(
+                sample_rate,
+                threshold=true_peak_limit,
+                ratio=float('inf'),
+                attack_ms=0,
+                release_ms=50.0,
+                knee_db=0,
+                detector='true_peak'
+            )
+
+    def process(self, samples: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalize a block (pass out=samples to work in place)"""
+        out = np.multiply(samples, np.float32(self.gain), out=out)
+        if self.limiter:
+            self.limiter.process(out, out=out)
+        return out
+
+
+def normalization_gain(measured_lufs: float, target_lufs: float) -> float:
+    """Gain in dB that brings measured loudness to the target (0 for silence)"""
+    if not np.isfinite(measured_lufs):
+        return 0.0
+    return target_lufs - measured_lufs
+
+
+def normalize_loudness(samples: np.ndarray,
+                       sample_rate: int,
+                       target_lufs: float = -16.0,
+                       true_peak_limit: Optional[float] = -1.0,
+                       block_seconds: float = DEFAULT_BLOCK_SECONDS) -> Dict:
+    """
+    Two-pass loudness normalization of a (frames, channels) buffer in place
+
+    The buffer may be a numpy.memmap; both passes walk it block by block.
+
+    Returns:
+        Dictionary with measured loudness and true peak, and the applied gain
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    block_frames = max(1, int(block_seconds * sample_rate))
+
+    meter = LoudnessMeter(sample_rate, samples.shape[1])
+    for start in range(0, len(samples), block_frames):
+        meter.process(samples[start:start + block_frames])
+
+    measured = meter.integrated_loudness()
+    gain_db = normalization_gain(measured, target_lufs)
+
+    normalizer = LoudnessNormalizer(sample_rate, gain_db, true_peak_limit)
+    for start in range(0, len(samples), block_frames):
+        block = samples[start:start + block_frames]
+        normalizer.process(block, out=block)
+
+    return {
+        'measured_lufs': measured,
+        'measured_true_peak': meter.true_peak_db(),
+        'target_lufs': target_lufs,
+        'gain_db': gain_db
+    }
@@ -0,0 +1,72 @@
+"""
+PCM Buffers
+Allocates float32 sample buffers for a render, optionally backed by
+numpy.memmap files so the OS can page cold audio out to disk
+"""
+
+import os
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+
+
+class ScratchSpace:
+    """Owns the sample buffers of one render and removes their backing files afterwards"""
+
+    def __init__(self, scratch_dir: Optional[str] = None, use_memmap: bool = False):
+        """
+        Args:
+            scratch_dir: Directory for memmap files (defaults to the system temp directory)
+            use_memmap: Back buffers with files instead of anonymous memory
+        """
+        self.scratch_dir = scratch_dir or tempfile.gettempdir()
+        self.use_memmap = use_memmap
+        self._paths: List[str] = []
+
+        if self.use_memmap:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def allocate(self, frames: int, channels: int) -> np.ndarray:
+        """Allocate a zeroed float32 buffer of shape (frames, channels)"""
+        if not self.use_memmap or frames == 0:
+            return np.zeros((frames, channels), dtype=np.float32)
+
+        fd, path = tempfile.mkstemp(prefix='pcm_', suffix='.f32', dir=self.scratch_dir)
+        os.close(fd)
+        buffer = np.memmap(path, dtype=np.float32, mode='w+', shape=(frames, channels))
+
+        # POSIX keeps the mapping alive after unlink, so nothing leaks if the worker dies
+        if os.name == 'posix':
+            os.unlink(path)
+        else:
+            self._paths.append(path)
+        return buffer
+
+    def store(self, samples: np.ndarray) -> np.ndarray:
+        """Place samples in a writable buffer owned by this scratch space"""
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if not self.use_memmap:
+            # Read-only input (cached or shared between renders) is copied, anything else is adopted
+            return np.require(samples, dtype=np.float32, requirements=['C', 'W'])
+
+        buffer = self.allocate(len(samples), samples.shape[1])
+        buffer[:] = samples
+        return buffer
+
+    def close(self) -> None:
+        """Remove backing files that could not be unlinked while mapped"""
+        for path in self._paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._paths = []
@@ -0,0 +1,240 @@
+"""
+Decoded PCM Cache
+Content-addressed on-disk store of decoded audio and processed segments
+shared by every worker process on a host; each kind is bounded in size
+separately with least-recently-used eviction
+"""
+
+import os
+import hashlib
+import json
+import tempfile
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows development hosts run without cross-process locking
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'podcastpro_pcm_cache')
+DEFAULT_MAX_MB = 2048
+DEFAULT_SEGMENTS_MAX_MB = 1024
+DEFAULT_ASSETS_MAX_MB = 512
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Bump when segment processing changes so stale processed segments miss
+SEGMENT_FORMAT_VERSION = 2
+
+
+class PcmCache:
+    """Stores decoded sample arrays as .npy files keyed by content hash and stream format"""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, segment_max_bytes: int = None):
+        """
+        Args:
+            cache_dir: Cache directory (defaults to PCM_CACHE_DIR or a shared temp directory)
+            max_bytes: Size limit for decoded sources (defaults to PCM_CACHE_MAX_MB megabytes)
+            segment_max_bytes: Size limit for processed segments, which are kept in
+                their own subdirectory so they never evict decoded sources
+                (defaults to PCM_SEGMENT_CACHE_MAX_MB megabytes)
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('PCM_CACHE_DIR', DEFAULT_CACHE_DIR))
+        self.segment_dir = self.cache_dir / 'segments'
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('PCM_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+        if segment_max_bytes is None:
+            segment_max_bytes = int(float(os.getenv('PCM_SEGMENT_CACHE_MAX_MB', DEFAULT_SEGMENTS_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+
+    def content_hash(self, file_path: str) -> str:
+        """SHA-256 of the file contents, memoized per path, size and mtime"""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._hashes:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            self._hashes[memo_key] = digest.hexdigest()
+        return self._hashes[memo_key]
+
+    def entry_path(self, file_path: str, sample_rate: int, channels: int) -> Path:
+        """Cache file for a source decoded at the given rate and channel layout"""
+        return self.cache_dir / f"{self.content_hash(file_path)}_{int(sample_rate)}_{int(channels)}.npy"
+
+    def segment_key(self, file_path: str, sample_rate: int, channels: int, params: Dict) -> str:
+        """
+        Key for a processed segment: the source content plus every parameter
+        (trim, fades, ...) that shaped it, so changing any of them misses
+        """
+        digest = hashlib.sha256()
+        digest.update(self.content_hash(file_path).encode())
+        digest.update(f"{SEGMENT_FORMAT_VERSION}:{int(sample_rate)}:{int(channels)}:".encode())
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def segment_path(self, key: str) -> Path:
+        """Cache file for a processed segment"""
+        return self.segment_dir / f"{key}.npy"
+
+    def get(self, file_path: str, sample_rate: int, channels: int) -> Optional[np.ndarray]:
+        """Return cached samples (memory-mapped, read-only) or None on a miss"""
+        return self._load(self.entry_path(file_path, sample_rate, channels), channels)
+
+    def put(self, file_path: str, sample_rate: int, channels: int, samples: np.ndarray) -> None:
+        """Store decoded samples of shape (frames, channels) for a source file"""
+        self._save(self.entry_path(file_path, sample_rate, channels), samples, self.max_bytes)
+
+    def get_segment(self, key: str, channels: int) -> Optional[np.ndarray]:
+        """Return a processed segment (memory-mapped, read-only) or None on a miss"""
+        return self._load(self.segment_path(key), channels)
+
+    def put_segment(self, key: str, samples: np.ndarray) -> None:
+        """Store a processed segment of shape (frames, channels)"""
+        self._save(self.segment_path(key), samples, self.segment_max_bytes)
+
+    def _load(self, entry: Path, channels: int) -> Optional[np.ndarray]:
+        """Memory-map an entry and mark it recently used"""
+        try:
+            samples = np.load(entry, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if samples.ndim != 2 or samples.shape[1] != channels:
+            return None
+
+        # Mark as recently used for eviction
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return samples
+
+    def _save(self, entry: Path, samples: np.ndarray, max_bytes: int) -> None:
+        """Write an entry atomically, then evict its directory down to max_bytes"""
+        if samples.nbytes > max_bytes:
+            return
+
+        # Write under a unique name and rename so readers never see partial files
+        temp_path = entry.parent / f".{entry.stem}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(samples))
+            os.replace(temp_path, entry)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self.evict(entry.parent, max_bytes)
+
+    def size(self) -> int:
+        """Total bytes held by cache entries"""
+        return sum(entry.stat().st_size for entry in self.cache_dir.glob('**/*.npy'))
+
+    def evict(self, directory: Path = None, max_bytes: int = None) -> None:
+        """
+        Remove least recently used entries from a cache directory (defaults to
+        the decoded sources) until it fits its size limit
+        """
+        directory = directory or self.cache_dir
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        lock_file = open(directory / '.lock', 'w')
+        try:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            entries = []
+            for entry in directory.glob('*.npy'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries, key=lambda item: item[0]):
+                if total <= max_bytes:
+                    break
+                try:
+                    entry.unlink()
+                    total -= size
+                except OSError:
+                    pass
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+class DecodedAssets:
+    """
+    Sources decoded to the render format and held in memory for the renders
+    of one batch, so assets every episode shares (intro, outro, music bed)
+    are decoded once; arrays are read-only and shared between renders
+    """
+
+    def __init__(self, max_bytes: int = None):
+        """
+        Args:
+            max_bytes: Memory limit (defaults to BATCH_ASSETS_MAX_MB megabytes);
+                sources beyond it are decoded for each render as usual
+        """
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv('BATCH_ASSETS_MAX_MB', DEFAULT_ASSETS_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: Dict[Tuple, np.ndarray] = {}
+        self._decoding: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_decode(self,
+                      file_path: str,
+                      sample_rate: int,
+                      channels: int,
+                      decode: Callable[[], Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        """
+        Samples of a source in the given format, calling decode on first use;
+        renders asking for a source that is being decoded wait for that decode
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return decode()
+
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, int(sample_rate), int(channels))
+        with self._lock:
+            decoding = self._decoding.setdefault(key, threading.Lock())
+
+        with decoding:
+            with self._lock:
+                samples = self._entries.get(key)
+                if samples is not None:
+                    self.hits += 1
+                    return samples
+
+            samples = decode()
+            if samples is None:
+                return None
+            samples = np.ascontiguousarray(samples)
+            samples.setflags(write=False)
+
+            with self._lock:
+                self.misses += 1
+                if self._bytes + samples.nbytes <= self.max_bytes:
+                    self._entries[key] = samples
+                    self._bytes += samples.nbytes
+            return samples
+
+    def size(self) -> int:
+        """Bytes of decoded samples held"""
+        return self._bytes
@@ -0,0 +1,256 @@
+"""
+Render Plans
+Compiles a template structure into a validated, immutable plan once
+per template version, so renders skip re-parsing and bad templates are
+rejected before a job is queued. Plans hold structure only: segment
+positions depend on each episode's files and on silence trimming, so the
+renderers place segments while rendering
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .fades import FADE_TYPES
+
+PLAN_CACHE_SIZE = 256
+
+
+class TemplateError(ValueError):
+    """A template structure that cannot be rendered"""
+
+
+@dataclass(frozen=True)
+class FadeSpec:
+    """Fade lengths in seconds and the curve shape"""
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+    fade_type: str = 'linear'
+
+    def to_dict(self) -> Dict:
+        """Fade settings as found in template and segment dictionaries"""
+        return {'fade_in': self.fade_in, 'fade_out': self.fade_out, 'fade_type': self.fade_type}
+
+
+@dataclass(frozen=True)
+class PlanSegment:
+    """One template slot, filled at bind time by the episode file of the same type"""
+    type: str
+    start_offset: float
+    end_offset: float
+    volume: float
+    fade: FadeSpec
+    trim_silence: Optional[Tuple[Tuple[str, float], ...]] = None  # None disables trimming
+
+
+@dataclass(frozen=True)
+class PlanMusic:
+    """The template's music bed"""
+    file_path: str
+    start_point: float
+    volume: float
+    loop_crossfade: float
+    fade: FadeSpec
+    ducking: Optional[Tuple[Tuple[str, float], ...]]  # None disables ducking
+
+    def to_dict(self) -> Dict:
+        """Music track dictionary as accepted by AdvancedAudioProcessor"""
+        return {
+            'type': 'upload',
+            'file_path': self.file_path,
+            'start_point': self.start_point,
+            'volume': self.volume,
+            'loop_crossfade': self.loop_crossfade,
+            **self.fade.to_dict(),
+            'ducking': dict(self.ducking) if self.ducking else self.ducking is not None
+        }
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """Validated, immutable form of a template structure (no timeline offsets)"""
+    template_id: Optional[str]
+    version: Optional[str]
+    segments: Tuple[PlanSegment, ...]
+    music: Optional[PlanMusic]
+
+    def bind(self, audio_files: List[Dict]) -> List[Dict]:
+        """
+        Resolve each segment to the episode's audio file for its type
+
+        Args:
+            audio_files: Episode files as dictionaries with segment_type and file_path
+
+        Returns:
+            Segment dictionaries as accepted by process_template_segments;
+            segments without a matching file are left out
+        """
+        files = {}
+        for audio_file in audio_files:
+            files.setdefault(audio_file.get('segment_type'), audio_file.get('file_path'))
+
+        return [
+            {
+                'audio_file': files[segment.type],
+                'timing': {'start_offset': segment.start_offset, 'end_offset': segment.end_offset},
+                'fade': segment.fade.to_dict(),
+                'volume': segment.volume,
+                'trim_silence': dict(segment.trim_silence) if segment.trim_silence else segment.trim_silence is not None,
+                'type': segment.type
+            }
+            for segment in self.segments
+            if files.get(segment.type)
+        ]
+
+    def music_track(self) -> Optional[Dict]:
+        """Music track dictionary for the processor, or None"""
+        return self.music.to_dict() if self.music else None
+
+
+def _number(value, name: str, default: float = 0.0, minimum: Optional[float] = 0.0) -> float:
+    """Parse a numeric template setting"""
+    if value is None or value == '':
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise TemplateError(f"{name} must be a number, got {value!r}")
+    if minimum is not None and number < minimum:
+        raise TemplateError(f"{name} must be at least {minimum:g}, got {number:g}")
+    return number
+
+
+def _fade(settings: Dict, name: str, default_in: float = 0.0, default_out: float = 0.0) -> FadeSpec:
+    """Parse fade settings"""
+    if not isinstance(settings, dict):
+        raise TemplateError(f"{name} must be an object")
+    fade_type = settings.get('fade_type') or 'linear'
+    if fade_type not in FADE_TYPES:
+        raise TemplateError(f"{name}.fade_type must be one of {', '.join(FADE_TYPES)}, got {fade_type!r}")
+    return FadeSpec(
+        fade_in=_number(settings.get('fade_in'), f"{name}.fade_in", default_in),
+        fade_out=_number(settings.get('fade_out'), f"{name}.fade_out", default_out),
+        fade_type=fade_type
+    )
+
+
+def _trim(value, name: str) -> Optional[Tuple[Tuple[str, float], ...]]:
+    """Parse silence trimming settings"""
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (key, _number(value[key], f"{name}.{key}", minimum=None if key == 'threshold_db' else 0.0))
+            for key in ('threshold_db', 'padding', 'max_pause')
+            if value.get(key) is not None
+        ))
+    return () if value else None
+
+
+def _music(music_track: Dict) -> Optional[PlanMusic]:
+    """Parse and check the music track"""
+    if not music_track:
+        return None
+    if not isinstance(music_track, dict):
+        raise TemplateError("music_track must be an object")
+    if music_track.get('type') != 'upload':
+        return None
+
+    file_path = music_track.get('file_path')
+    if not file_path:
+        raise TemplateError("music_track.file_path is required for uploaded music")
+    if not os.path.exists(file_path):
+        raise TemplateError(f"Music file not found: {file_path}")
+
+    ducking = music_track.get('ducking', True)
+    if isinstance(ducking, dict):
+        ducking = tuple(sorted(
+            (key, _number(value, f"music_track.ducking.{key}", minimum=None))
+            for key, value in ducking.items()
+        ))
+    elif ducking:
+        ducking = ()
+    else:
+        ducking = None
+
+    return PlanMusic(
+        file_path=file_path,
+        start_point=_number(music_track.get('start_point'), 'music_track.start_point'),
+        volume=_number(music_track.get('volume'), 'music_track.volume', default=-10.0, minimum=None),
+        loop_crossfade=_number(music_track.get('loop_crossfade'), 'music_track.loop_crossfade'),
+        fade=_fade(music_track, 'music_track', default_in=2.0, default_out=3.0),
+        ducking=ducking
+    )
+
+
+def compile_structure(structure: Dict,
+                      template_id: Optional[str] = None,
+                      version: Optional[str] = None) -> RenderPlan:
+    """
+    Validate a template structure and compile it into a render plan
+
+    Raises:
+        TemplateError: If the structure cannot be rendered
+    """
+    if not isinstance(structure, dict):
+        raise TemplateError("Template structure must be an object")
+
+    raw_segments = structure.get('segments')
+    if not isinstance(raw_segments, list) or not raw_segments:
+        raise TemplateError("Template needs at least one segment")
+
+    segments = []
+    for index, segment in enumerate(raw_segments):
+        name = f"segments[{index}]"
+        if not isinstance(segment, dict):
+            raise TemplateError(f"{name} must be an object")
+        if not segment.get('type'):
+            raise TemplateError(f"{name}.type is required")
+
+        timing = segment.get('timing') or {}
+        if not isinstance(timing, dict):
+            raise TemplateError(f"{name}.timing must be an object")
+
+        segments.append(PlanSegment(
+            type=str(segment['type']),
+            start_offset=_number(timing.get('start_offset'), f"{name}.timing.start_offset"),
+            end_offset=_number(timing.get('end_offset'), f"{name}.timing.end_offset"),
+            volume=_number(segment.get('volume'), f"{name}.volume", minimum=None),
+            fade=_fade(segment.get('fade') or {}, f"{name}.fade"),
+            trim_silence=_trim(segment.get('trim_silence'), f"{name}.trim_silence")
+        ))
+
+    return RenderPlan(
+        template_id=template_id,
+        version=version,
+        segments=tuple(segments),
+        music=_music(structure.get('music_track'))
+    )
+
+
+_plans: 'OrderedDict[Tuple[str, str], RenderPlan]' = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_template(template) -> RenderPlan:
+    """
+    Render plan for a Template row, compiled once per id and updated_at
+
+    Raises:
+        TemplateError: If the template cannot be rendered
+    """
+    version = template.updated_at.isoformat() if template.updated_at else None
+    key = (str(template.id), version)
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+
+    plan = compile_structure(template.structure, str(template.id), version)
+
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,75 @@
+"""
+Resampling
+Converts decoded float32 sources to the render's sample rate and channel
+layout in one vectorized pass, using a polyphase filter for rate changes
+"""
+
+from math import gcd
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+from scipy.signal import resample_poly
+
+DEFAULT_SAMPLE_RATE = 44100
+
+# A single hi-res or surround source should not make the whole render pay for it
+MAX_RENDER_SAMPLE_RATE = 48000
+MAX_RENDER_CHANNELS = 2
+
+
+def render_format(formats: Iterable[Dict]) -> Tuple[int, int]:
+    """
+    Canonical sample rate and channel count for a render: the highest rate
+    and widest layout among the sources (probe_audio dictionaries), capped
+    at 48 kHz stereo
+    """
+    sample_rate, channels = 0, 0
+    for fmt in formats:
+        sample_rate = max(sample_rate, int(fmt['sample_rate']))
+        channels = max(channels, int(fmt['channels']))
+    return (min(sample_rate or DEFAULT_SAMPLE_RATE, MAX_RENDER_SAMPLE_RATE),
+            min(channels or 1, MAX_RENDER_CHANNELS))
+
+
+def convert_channels(samples: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Change the channel count of a (frames, channels) block
+
+    Mono is duplicated to every channel and anything else is averaged down,
+    matching pydub's set_channels.
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    source_channels = samples.shape[1]
+    if source_channels == channels:
+        return samples
+
+    if source_channels != 1:
+        samples = samples.mean(axis=1, keepdims=True, dtype=np.float32)
+    if channels == 1:
+        return samples
+    return np.repeat(samples, channels, axis=1)
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Resample a float32 (frames, channels) block with a polyphase anti-aliasing filter"""
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    divisor = gcd(int(source_rate), int(target_rate))
+    resampled = resample_poly(samples, target_rate // divisor, source_rate // divisor, axis=0)
+    return resampled.astype(np.float32, copy=False)
+
+
+def to_render_format(samples: np.ndarray, source_rate: int, target_rate: int, channels: int) -> np.ndarray:
+    """
+    Convert samples to the render's rate and layout
+
+    Downmixing happens before the rate change and upmixing after it, so the
+    filter always runs over the fewest channels.
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    if channels < samples.shape[1]:
+        samples = convert_channels(samples, channels)
+    samples = resample(samples, source_rate, target_rate)
+    return convert_channels(samples, channels)
@@ -0,0 +1,182 @@
+"""
+Silence Trimming
+Framewise energy analysis that finds leading and trailing dead air and long
+pauses, returned as frame ranges to keep so callers can trim by slicing
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio_stream import PcmDecoder
+from .dynamics import EPSILON
+
+DEFAULT_THRESHOLD_DB = -45.0
+DEFAULT_PADDING = 0.15
+ANALYSIS_FRAME_SECONDS = 0.02
+
+# Streaming analysis decodes mono at a low rate; energy needs no more
+ANALYSIS_SAMPLE_RATE = 16000
+ANALYSIS_BLOCK_SECONDS = 10.0
+
+
+class SilenceDetector:
+    """
+    Framewise RMS level of a stream, fed block by block
+
+    Only one level per analysis frame is kept, so a long recording can be
+    analysed while it is decoded without holding its samples.
+    """
+
+    def __init__(self,
+                 sample_rate: int,
+                 threshold_db: float = DEFAULT_THRESHOLD_DB,
+                 frame_seconds: float = ANALYSIS_FRAME_SECONDS):
+        """
+        Args:
+            sample_rate: Sample rate of the analysed audio
+            threshold_db: Frame level in dBFS at or below which a frame is silent
+            frame_seconds: Length of an analysis frame
+        """
+        self.sample_rate = sample_rate
+        self.threshold_db = float(threshold_db)
+        self.frame = max(1, int(round(frame_seconds * sample_rate)))
+        self.frames = 0
+        self._levels: List[np.ndarray] = []
+        self._pending = np.zeros(0)
+
+    def process(self, samples: np.ndarray) -> None:
+        """Add the next (frames, channels) block of the stream"""
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if len(samples) == 0:
+            return
+
+        power = np.mean(np.square(samples, dtype=np.float64), axis=1)
+        if len(self._pending):
+            power = np.concatenate([self._pending, power])
+        whole = len(power) - len(power) % self.frame
+        self._levels.append(power[:whole].reshape(-1, self.frame).mean(axis=1))
+        self._pending = power[whole:]
+        self.frames += len(samples)
+
+    def active(self) -> np.ndarray:
+        """Whether each analysis frame (the last may be partial) is above the threshold"""
+        levels = self._levels + ([self._pending.mean(keepdims=True)] if len(self._pending) else [])
+        if not levels:
+            return np.zeros(0, dtype=bool)
+        power = np.concatenate(levels)
+        return 10.0 * np.log10(power + EPSILON) > self.threshold_db
+
+    def keep_ranges(self, padding: float = DEFAULT_PADDING, max_pause: Optional[float] = None) -> List[Tuple[int, int]]:
+        """
+        Sample ranges to keep, in order
+
+        Args:
+            padding: Seconds of silence left before the first and after the last
+                active frame
+            max_pause: Internal silences longer than this many seconds are cut
+                down to it, keeping half of it on either side (None keeps pauses)
+
+        Returns:
+            (start, end) sample ranges; empty when the stream is entirely silent
+        """
+        active = self.active()
+        if not active.any():
+            return []
+
+        frame = self.frame
+        pad = int(round(padding * self.sample_rate))
+        first = int(np.argmax(active))
+        last = len(active) - int(np.argmax(active[::-1]))
+        start = max(0, first * frame - pad)
+        end = min(self.frames, last * frame + pad)
+
+        if max_pause is None:
+            return [(start, end)]
+
+        # Silent runs strictly inside the active span, as (first, last + 1) frame indices
+        inner = active[first:last]
+        edges = np.diff(np.concatenate([[True], inner, [True]]).astype(np.int8))
+        run_starts = np.flatnonzero(edges == -1) + first
+        run_ends = np.flatnonzero(edges == 1) + first
+
+        keep = int(round(max_pause * self.sample_rate))
+        ranges = []
+        position = start
+        for run_start, run_end in zip((run_starts * frame).tolist(), (run_ends * frame).tolist()):
+            if run_end - run_start <= keep:
+                continue
+            ranges.append((position, run_start + keep // 2))
+            position = run_end - (keep - keep // 2)
+        ranges.append((position, end))
+        return ranges
+
+
+def trim_settings(value) -> Optional[Dict]:
+    """
+    Normalize a segment's trim_silence setting: True for the defaults, a
+    dictionary of threshold_db, padding and max_pause, or falsy to disable
+    """
+    if not value:
+        return None
+    settings = {'threshold_db': DEFAULT_THRESHOLD_DB, 'padding': DEFAULT_PADDING, 'max_pause': None}
+    if isinstance(value, dict):
+        for key in settings:
+            if value.get(key) is not None:
+                settings[key] = float(value[key])
+    return settings
+
+
+def find_keep_ranges(samples: np.ndarray, sample_rate: int, settings: Dict) -> List[Tuple[int, int]]:
+    """
+    Sample ranges of decoded audio to keep under the given trim settings; the
+    detector is fed block by block, so its temporaries stay block-sized
+    """
+    detector = SilenceDetector(sample_rate, settings['threshold_db'])
+    block = int(ANALYSIS_BLOCK_SECONDS * sample_rate)
+    for position in range(0, len(samples), block):
+        detector.process(samples[position:position + block])
+    return detector.keep_ranges(settings['padding'], settings['max_pause'])
+
+
+def analyze_file(file_path: str,
+                 settings: Dict,
+                 start_time: float = 0.0,
+                 duration: Optional[float] = None) -> Optional[List[Tuple[float, float]]]:
+    """
+    Time ranges to keep within [start_time, start_time + duration) of a file
+
+    The file is decoded block by block as low-rate mono, so memory stays
+    bounded whatever the recording's length.
+
+    Returns:
+        (start, end) ranges in seconds relative to start_time, or None if the
+        file could not be decoded
+    """
+    detector = SilenceDetector(ANALYSIS_SAMPLE_RATE, settings['threshold_db'])
+    block = int(ANALYSIS_BLOCK_SECONDS * ANALYSIS_SAMPLE_RATE)
+    try:
+        decoder = PcmDecoder(file_path, ANALYSIS_SAMPLE_RATE, 1, start_time, duration)
+    except OSError as e:
+        print(f"Error analysing {file_path}: {str(e)}")
+        return None
+
+    try:
+        while True:
+            samples = decoder.read(block)
+            detector.process(samples)
+            if len(samples) < block:
+                break
+    finally:
+        decoder.close()
+
+    if decoder.failed:
+        print(f"Error analysing {file_path}: ffmpeg exited with {decoder.process.returncode}")
+        return None
+    if detector.frames == 0:
+        return None
+    return [
+        (start / ANALYSIS_SAMPLE_RATE, end / ANALYSIS_SAMPLE_RATE)
+        for start, end in detector.keep_ranges(settings['padding'], settings['max_pause'])
+    ]
@@ -0,0 +1,231 @@
+"""
+Episode Tagging
+Writes title, episode and season numbers, cover art and chapters into a
+rendered file's tag header, leaving the encoded audio untouched
+"""
+
+import base64
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from mutagen.flac import Picture
+from mutagen.id3 import (
+    APIC, CHAP, COMM, CTOC, ID3, TALB, TCON, TDRC, TIT2, TPE1, TPOS, TRCK,
+    CTOCFlags, ID3NoHeaderError, PictureType
+)
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+
+# Room left in a new tag so later edits (a longer title, new chapters) fit
+# in place instead of moving the audio
+TAG_PADDING = 16 * 1024
+
+ID3_EXTENSIONS = {'.mp3'}
+COVER_ART_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+COVER_ART_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff')
+VORBIS_COMMENT_FORMATS = {'.opus': OggOpus, '.ogg': OggVorbis}
+
+
+def chapter_title(segment: Dict) -> str:
+    """Chapter title for a template segment"""
+    title = segment.get('title') or segment.get('name')
+    if title:
+        return str(title)
+    return str(segment.get('type') or 'Segment').replace('_', ' ').title()
+
+
+def _cover_art(cover: Union[str, bytes, None]) -> Optional[Dict]:
+    """Image bytes and MIME type from a path or raw bytes"""
+    if not cover:
+        return None
+    if isinstance(cover, (str, Path)):
+        if not os.path.isfile(cover):
+            return None
+        with open(cover, 'rb') as handle:
+            cover = handle.read()
+    mime = 'image/png' if cover.startswith(b'\x89PNG') else 'image/jpeg'
+    return {'data': cover, 'mime': mime}
+
+
+def _padding(info) -> int:
+    """Keep the existing tag size whenever the new frames fit"""
+    if info.padding >= 0:
+        return info.padding
+    return TAG_PADDING
+
+
+def _timestamp(seconds: float) -> str:
+    """HH:MM:SS.mmm as used by Vorbis comment chapters"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    return f"{hours:02d}:{minutes:02d}:{milliseconds // 1000:02d}.{milliseconds % 1000:03d}"
+
+
+def write_id3(audio_path: str, metadata: Dict) -> None:
+    """Write ID3v2.3 frames, including CHAP/CTOC chapters, into an MP3's header"""
+    try:
+        tags = ID3(audio_path)
+    except ID3NoHeaderError:
+        tags = ID3()
+
+    text_frames = [
+        (TIT2, metadata.get('title')),
+        (TPE1, metadata.get('artist')),
+        (TALB, metadata.get('album')),
+        (TRCK, metadata.get('episode_number')),
+        (TPOS, metadata.get('season_number')),
+        (TDRC, metadata.get('date')),
+        (TCON, metadata.get('genre', 'Podcast'))
+    ]
+    for frame, value in text_frames:
+        if value is not None and value != '':
+            tags.setall(frame.__name__, [frame(encoding=3, text=[str(value)])])
+
+    if metadata.get('description'):
+        tags.setall('COMM', [COMM(encoding=3, lang='eng', desc='', text=[metadata['description']])])
+
+    cover = _cover_art(metadata.get('cover_art'))
+    if cover:
+        tags.setall('APIC', [APIC(encoding=3, mime=cover['mime'], type=PictureType.COVER_FRONT,
+                                  desc='Cover', data=cover['data'])])
+
+    chapters = metadata.get('chapters')
+    if chapters is not None:
+        tags.delall('CHAP')
+        tags.delall('CTOC')
+        element_ids = []
+        for index, chapter in enumerate(chapters):
+            element_id = f"chp{index}"
+            element_ids.append(element_id)
+            tags.add(CHAP(
+                element_id=element_id,
+                start_time=int(round(chapter['start'] * 1000)),
+                end_time=int(round(chapter['end'] * 1000)),
+                sub_frames=[TIT2(encoding=3, text=[chapter['title']])]
+            ))
+        if element_ids:
+            tags.add(CTOC(
+                element_id='toc',
+                flags=CTOCFlags.TOP_LEVEL | CTOCFlags.ORDERED,
+                child_element_ids=element_ids,
+                sub_frames=[TIT2(encoding=3, text=['Chapters'])]
+            ))
+
+    tags.save(audio_path, v2_version=3, padding=_padding)
+
+
+def write_vorbis_comments(audio_path: str, metadata: Dict) -> None:
+    """Write Vorbis comments, with chapters in the CHAPTERxxx convention, into an Ogg file's header"""
+    audio = VORBIS_COMMENT_FORMATS[Path(audio_path).suffix.lower()](audio_path)
+    comments = [
+        ('TITLE', metadata.get('title')),
+        ('ARTIST', metadata.get('artist')),
+        ('ALBUM', metadata.get('album')),
+        ('TRACKNUMBER', metadata.get('episode_number')),
+        ('DISCNUMBER', metadata.get('season_number')),
+        ('DATE', metadata.get('date')),
+        ('GENRE', metadata.get('genre', 'Podcast')),
+        ('DESCRIPTION', metadata.get('description'))
+    ]
+    for key, value in comments:
+        if value is not None and value != '':
+            audio[key] = [str(value)]
+
+    cover = _cover_art(metadata.get('cover_art'))
+    if cover:
+        picture = Picture()
+        picture.type = PictureType.COVER_FRONT
+        picture.mime = cover['mime']
+        picture.desc = 'Cover'
+        picture.data = cover['data']
+        audio['METADATA_BLOCK_PICTURE'] = [base64.b64encode(picture.write()).decode('ascii')]
+
+    chapters = metadata.get('chapters')
+    if chapters is not None:
+        for key in [key for key in audio.keys() if key.upper().startswith('CHAPTER')]:
+            del audio[key]
+        for index, chapter in enumerate(chapters, start=1):
+            audio[f"CHAPTER{index:03d}"] = [_timestamp(chapter['start'])]
+            audio[f"CHAPTER{index:03d}NAME"] = [chapter['title']]
+
+    audio.save(padding=_padding)
+
+
+def write_tags(audio_path: str, metadata: Dict) -> None:
+    """
+    Tag a rendered file in place without re-encoding it
+
+    Args:
+        audio_path: MP3, Opus or Ogg Vorbis file
+        metadata: Any of title, artist, album, episode_number, season_number,
+            date, genre, description, cover_art (image path or bytes) and
+            chapters (list of dictionaries with title, start and end in seconds;
+            an empty list removes existing chapters)
+
+    Raises:
+        ValueError: If the file's format cannot be tagged
+    """
+    extension = Path(audio_path).suffix.lower()
+    if extension in ID3_EXTENSIONS:
+        write_id3(audio_path, metadata)
+    elif extension in VORBIS_COMMENT_FORMATS:
+        write_vorbis_comments(audio_path, metadata)
+    else:
+        raise ValueError(f"Cannot tag {extension or 'extensionless'} files")
+
+
+def uploaded_image(path: Optional[str], upload_dir: Union[str, Path]) -> Optional[str]:
+    """
+    Real path of a PNG or JPEG file inside upload_dir, or None when the path
+    resolves outside it ('..' and symlinks included) or the file is not
+    such an image
+    """
+    if not path:
+        return None
+    root = os.path.realpath(upload_dir)
+    resolved = os.path.realpath(path)
+    if not resolved.startswith(root + os.sep) or not os.path.isfile(resolved):
+        return None
+    if os.path.splitext(resolved)[1].lower() not in COVER_ART_EXTENSIONS:
+        return None
+    with open(resolved, 'rb') as handle:
+        if not handle.read(8).startswith(COVER_ART_SIGNATURES):
+            return None
+    return resolved
+
+
+def episode_tags(episode,
+                 podcast=None,
+                 chapters: Optional[List[Dict]] = None,
+                 upload_folder: Optional[str] = None) -> Dict:
+    """
+    Tag metadata for an Episode row and its Podcast
+
+    Cover art paths come from client-editable fields, so they are embedded
+    only when they point at an image in the podcast owner's uploads under
+    upload_folder (no cover art without both); relative paths are taken
+    from upload_folder, as stored for uploaded files.
+    """
+    episode_metadata = episode.episode_metadata or {}
+    published = episode.published_at or episode.created_at
+    metadata = {
+        'title': episode.title,
+        'description': episode.description,
+        'episode_number': episode.episode_number,
+        'season_number': episode.season_number,
+        'date': str(published.year) if published else None,
+        'chapters': chapters if chapters is not None else episode.chapters
+    }
+    if podcast is not None:
+        metadata['album'] = podcast.name
+        metadata['artist'] = podcast.author or podcast.name
+        if upload_folder:
+            owner_uploads = os.path.join(upload_folder, str(podcast.user_id))
+            for cover_art in (episode_metadata.get('cover_art'), podcast.cover_art_url):
+                cover_art = cover_art and uploaded_image(os.path.join(upload_folder, str(cover_art)), owner_uploads)
+                if cover_art:
+                    metadata['cover_art'] = cover_art
+                    break
+    return metadata
@@ -2,52 +2,185 @@
 Celery background tasks for PodcastPro v2
 """
 
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from celery import shared_task
-from core.advanced_audio_processor import AdvancedAudioProcessor
-from database.models import Episode, Podcast, Template
+from core.advanced_audio_processor import AdvancedAudioProcessor, PUBLISH_OUTPUT_PROFILES
+from core.encoder_pool import EncoderPool
+from core.instrumentation import Instrumentation, log_span
+from core.pcm_cache import DecodedAssets, PcmCache
+from core.render_plan import compile_template
+from core.tagging import episode_tags
+from core.waveform import build_peaks
+from database.models import Episode, Job, Podcast, Template
 from database import get_db_session
 
 logger = logging.getLogger(__name__)
 
-# Register process_episode_task at module level
-@shared_task(bind=True, name='podcast_tasks.process_episode')
-def process_episode_task(self, episode_id, user_id, job_id):
-    """Background task to process an episode using real audio processing"""
+# Per-process handle on the host-wide decoded PCM cache
+_pcm_cache = None
+
+# Per-process warm ffmpeg encoders, reused across episodes
+_encoder_pool = None
+
+
+def get_pcm_cache():
+    """Get this worker's PCM cache handle, or None when caching is disabled"""
+    global _pcm_cache
+    if _pcm_cache is None and os.getenv('PCM_CACHE_ENABLED', 'true').lower() == 'true':
+        _pcm_cache = PcmCache()
+    return _pcm_cache
+
+
+def get_encoder_pool():
+    """Get this worker's encoder pool (ENCODER_POOL_SIZE=0 spawns encoders on demand)"""
+    global _encoder_pool
+    if _encoder_pool is None:
+        # Staging next to the outputs makes finishing an encode a rename
+        _encoder_pool = EncoderPool(work_dir=os.getenv('ENCODER_WORK_DIR', 'outputs'))
+    return _encoder_pool
+
+
+def render_episode(episode_id, job_id, decoded_assets=None):
+    """
+    Render one episode and record the result on its Episode and Job rows
+
+    Args:
+        episode_id: Episode to render
+        job_id: Job tracking the render
+        decoded_assets: Shared assets decoded once for a batch of renders (optional)
+
+    Returns:
+        Task result dictionary; on failure the episode and job are marked
+        failed and the exception is re-raised
+    """
+    instrumentation = None
     try:
-        logger.info(f"Starting REAL episode processing for episode_id={episode_id}")
         db = get_db_session()
         episode = db.query(Episode).filter(Episode.id == episode_id).first()
         if not episode:
             raise Exception(f"Episode {episode_id} not found")
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if job:
+            job.status = 'processing'
+            job.started_at = datetime.now(timezone.utc)
+            job.progress_percent = 0
+            job.current_step = 'starting'
+            db.commit()
+        
+        def report_progress(percent, step):
+            """Show the stage being rendered on the Job row"""
+            if job:
+                job.progress_percent = percent
+                job.current_step = step
+                db.commit()
+        
+        # Stage spans go to the worker log and are stored on the Job row
+        instrumentation = Instrumentation(hooks=[log_span], on_progress=report_progress)
         template = db.query(Template).filter(Template.id == episode.template_id).first()
         if not template:
             raise Exception(f"Template {episode.template_id} not found")
-        # Parse template content (assume JSON)
-        import json
-        template_data = json.loads(template.content) if isinstance(template.content, str) else template.content
+        # Validated plan, compiled once per template version
+        plan = compile_template(template)
         # Gather episode audio files (assume episode.audio_files is a list of dicts)
         episode_data = {
             'audio_files': episode.audio_files if hasattr(episode, 'audio_files') else [],
             'ai_content': episode.episode_metadata.get('ai_content') if hasattr(episode, 'episode_metadata') else None
         }
-        processor = AdvancedAudioProcessor(output_dir='outputs')
-        result = processor.create_episode_from_template(template_data, episode_data, output_filename=None)
+        loudness_target = os.getenv('LOUDNESS_TARGET_LUFS')  # unset leaves levels untouched
+        processor = AdvancedAudioProcessor(
+            output_dir='outputs',
+            streaming=os.getenv('STREAMING_RENDER', 'false').lower() == 'true',
+            block_seconds=float(os.getenv('STREAMING_BLOCK_SECONDS', 10)),
+            pcm_cache=get_pcm_cache(),
+            use_memmap=os.getenv('RENDER_USE_MEMMAP', 'false').lower() == 'true',
+            scratch_dir=os.getenv('RENDER_SCRATCH_DIR'),
+            decode_workers=int(os.getenv('DECODE_WORKERS', 4)),
+            decode_executor=os.getenv('DECODE_EXECUTOR', 'thread'),
+            loudness_target=float(loudness_target) if loudness_target else None,
+            true_peak_limit=float(os.getenv('TRUE_PEAK_LIMIT_DBTP', -1.0)),
+            encoder_pool=get_encoder_pool(),
+            output_profiles=PUBLISH_OUTPUT_PROFILES,
+            instrumentation=instrumentation,
+            decoded_assets=decoded_assets
+        )
+        result = processor.create_episode_from_template(plan, episode_data, output_filename=None)
         if not result.get('success'):
             raise Exception(result.get('error', 'Unknown error during audio processing'))
-        # Update episode with output file
+        # Update episode with output file and every published rendition
         episode.output_file = result['output_path']
+        outputs = result.get('outputs', [])
+        chapters = result.get('chapters', [])
+        # Tag every rendition in place; only the tag header is written
+        podcast = db.query(Podcast).filter(Podcast.id == episode.podcast_id).first()
+        with instrumentation.span('tag', progress=90):
+            tags = episode_tags(episode, podcast, chapters, os.getenv('UPLOAD_FOLDER', 'uploads'))
+            for output in outputs:
+                if processor.add_metadata(output['path'], tags):
+                    output['size_bytes'] = os.path.getsize(output['path'])
+        # Render results live in their own columns, which episode updates never write
+        episode.renditions = outputs
+        episode.chapters = chapters
+        episode.duration = int(round(result['duration']))
+        if outputs:
+            episode.file_size_bytes = outputs[0]['size_bytes']
         episode.status = 'completed'
+        if job:
+            job.status = 'completed'
+            job.progress_percent = 100
+            job.current_step = 'completed'
+            job.completed_at = datetime.now(timezone.utc)
+            job.output_data = {
+                **(job.output_data or {}),
+                'output_file': result['output_path'],
+                'outputs': outputs,
+                'instrumentation': instrumentation.summary()
+            }
         db.commit()
         logger.info(f"Episode processing completed for episode_id={episode_id}")
+        # Waveform peaks for the episode page are built outside the render
+        try:
+            generate_waveform_task.delay(result['output_path'])
+        except Exception as e:
+            logger.warning(f"Could not queue waveform for episode_id={episode_id}: {str(e)}")
         return {
             'episode_id': episode_id,
             'status': 'completed',
             'output_file': result['output_path'],
+            'outputs': outputs,
             'message': 'Episode processing completed successfully',
             'completed_at': datetime.now(timezone.utc).isoformat()
         }
+    except Exception as e:
+        # Mark episode and job as failed, keeping the spans of the stages that ran
+        try:
+            db = get_db_session()
+            db.rollback()
+            episode = db.query(Episode).filter(Episode.id == episode_id).first()
+            if episode:
+                episode.status = 'failed'
+            job = db.query(Job).filter(Job.id == job_id).first()
+            if job:
+                job.status = 'failed'
+                job.error_message = str(e)
+                job.completed_at = datetime.now(timezone.utc)
+                if instrumentation:
+                    job.output_data = {**(job.output_data or {}), 'instrumentation': instrumentation.summary()}
+            db.commit()
+        except Exception:
+            pass
+        raise
+
+
+# Register process_episode_task at module level
+@shared_task(bind=True, name='podcast_tasks.process_episode')
+def process_episode_task(self, episode_id, user_id, job_id):
+    """Background task to process an episode using real audio processing"""
+    try:
+        logger.info(f"Starting REAL episode processing for episode_id={episode_id}")
+        return render_episode(episode_id, job_id)
     except Exception as e:
         logger.error(f"Episode processing failed: {str(e)}")
         self.update_state(
@@ -57,15 +190,76 @@ def process_episode_task(self, episode_id, user_id, job_id):
                 'message': 'Episode processing failed'
             }
         )
-        # Mark episode as failed
-        try:
-            db = get_db_session()
-            episode = db.query(Episode).filter(Episode.id == episode_id).first()
-            if episode:
-                episode.status = 'failed'
-                db.commit()
-        except Exception:
-            pass
+        raise
+
+
+@shared_task(bind=True, name='podcast_tasks.process_episode_batch')
+def process_episode_batch_task(self, renders, user_id):
+    """
+    Background task to render many episodes of one template in a single worker
+
+    Shared assets are decoded once for the whole batch, the compiled plan
+    and the warm encoders are reused, and BATCH_RENDER_WORKERS episodes
+    render at a time (one after another by default). One failed episode
+    does not stop the others. Parallel renders share the process's CPU, I/O
+    and memory counters, so the spans stored on their Job rows are marked
+    overlapping.
+
+    Args:
+        renders: List of [episode_id, job_id] pairs
+        user_id: Owner of the episodes
+    """
+    logger.info(f"Starting batch processing of {len(renders)} episodes")
+    decoded_assets = DecodedAssets()
+    workers = max(1, min(int(os.getenv('BATCH_RENDER_WORKERS', 1)), len(renders) or 1))
+    completed = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(render_episode, episode_id, job_id, decoded_assets): episode_id
+            for episode_id, job_id in renders
+        }
+        for future in as_completed(futures):
+            episode_id = futures[future]
+            try:
+                completed.append(future.result())
+            except Exception as e:
+                logger.error(f"Episode processing failed for episode_id={episode_id}: {str(e)}")
+                failed.append({'episode_id': episode_id, 'error': str(e)})
+            self.update_state(
+                state='PROGRESS',
+                meta={'done': len(completed) + len(failed), 'total': len(renders)}
+            )
+    
+    logger.info(
+        f"Batch processing finished: {len(completed)} completed, {len(failed)} failed, "
+        f"shared assets decoded {decoded_assets.misses} times and reused {decoded_assets.hits} times"
+    )
+    return {
+        'status': 'completed' if not failed else 'partial',
+        'episodes': completed,
+        'failed': failed,
+        'shared_assets': {'decoded': decoded_assets.misses, 'reused': decoded_assets.hits},
+        'completed_at': datetime.now(timezone.utc).isoformat()
+    }
+
+
+@shared_task(bind=True, name='podcast_tasks.generate_waveform')
+def generate_waveform_task(self, audio_path):
+    """Background task to build the waveform peak pyramid next to an audio file"""
+    try:
+        logger.info(f"Starting waveform generation for {audio_path}")
+        output_path = build_peaks(audio_path)
+        if not output_path:
+            raise Exception(f"Could not read audio from {audio_path}")
+        return {
+            'audio_path': audio_path,
+            'peaks_path': output_path,
+            'status': 'completed',
+            'completed_at': datetime.now(timezone.utc).isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Waveform generation failed: {str(e)}")
         raise
 
 
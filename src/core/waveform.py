@@ -0,0 +1,214 @@
+"""
+Waveform Peaks
+Builds min/max peak pyramids at several zoom levels in one streaming decode
+and stores them as a compact binary file that can be read by range
+"""
+
+import os
+import struct
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .audio_probe import probe_audio
+from .audio_stream import PcmDecoder
+
+PEAKS_SUFFIX = '.peaks'
+PEAKS_MAGIC = b'PEAK'
+PEAKS_VERSION = 1
+
+# magic, version, sample rate, frames, samples per peak at level 0, zoom factor, level count
+PEAKS_HEADER = struct.Struct('<4sHIQIHH')
+PEAKS_LEVEL = struct.Struct('<Q')
+
+DEFAULT_SAMPLES_PER_PEAK = 256
+DEFAULT_ZOOM_FACTOR = 4
+
+# Coarser levels are added until one fits a wide view in a single read
+MAX_TOP_LEVEL_PEAKS = 2048
+
+DECODE_BLOCK_SECONDS = 10.0
+
+
+def peaks_path(audio_path: str) -> str:
+    """Path of the peak file stored next to an audio file"""
+    return f"{audio_path}{PEAKS_SUFFIX}"
+
+
+class WaveformBuilder:
+    """
+    Accumulates level 0 min/max peaks block by block; coarser levels are
+    reduced from level 0 once the stream ends
+    """
+
+    def __init__(self,
+                 sample_rate: int,
+                 samples_per_peak: int = DEFAULT_SAMPLES_PER_PEAK,
+                 factor: int = DEFAULT_ZOOM_FACTOR):
+        """
+        Args:
+            sample_rate: Sample rate of the audio
+            samples_per_peak: Frames covered by each level 0 peak
+            factor: Peaks of one level merged into each peak of the next
+        """
+        self.sample_rate = sample_rate
+        self.samples_per_peak = max(1, int(samples_per_peak))
+        self.factor = max(2, int(factor))
+        self.frames = 0
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+        self._pending = np.zeros((0, 2), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> None:
+        """Add the next float32 (frames, channels) block; channels share one envelope"""
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        if len(samples) == 0:
+            return
+
+        extremes = np.stack([samples.min(axis=1), samples.max(axis=1)], axis=1)
+        if len(self._pending):
+            extremes = np.concatenate([self._pending, extremes])
+        whole = len(extremes) - len(extremes) % self.samples_per_peak
+        bins = extremes[:whole].reshape(-1, self.samples_per_peak, 2)
+        self._mins.append(bins[:, :, 0].min(axis=1))
+        self._maxs.append(bins[:, :, 1].max(axis=1))
+        self._pending = extremes[whole:]
+        self.frames += len(samples)
+
+    def levels(self) -> List[np.ndarray]:
+        """int8 (peaks, 2) min/max arrays from finest to coarsest"""
+        mins = self._mins + ([self._pending[:, 0].min(keepdims=True)] if len(self._pending) else [])
+        maxs = self._maxs + ([self._pending[:, 1].max(keepdims=True)] if len(self._pending) else [])
+        if not mins:
+            return [np.zeros((0, 2), dtype=np.int8)]
+
+        level = np.stack([np.concatenate(mins), np.concatenate(maxs)], axis=1)
+        level = np.clip(np.round(level * 127.0), -128, 127).astype(np.int8)
+
+        levels = [level]
+        while len(level) > MAX_TOP_LEVEL_PEAKS:
+            # Repeating the last peak pads a partial group without changing its extremes
+            padding = -len(level) % self.factor
+            if padding:
+                level = np.concatenate([level, np.repeat(level[-1:], padding, axis=0)])
+            groups = level.reshape(-1, self.factor, 2)
+            level = np.stack([groups[:, :, 0].min(axis=1), groups[:, :, 1].max(axis=1)], axis=1)
+            levels.append(level)
+        return levels
+
+    def write(self, path: str) -> None:
+        """Write the pyramid to path, replacing any previous file atomically"""
+        levels = self.levels()
+        directory = os.path.dirname(os.path.abspath(path))
+        descriptor, staging = tempfile.mkstemp(prefix='.peaks_', dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as handle:
+                handle.write(PEAKS_HEADER.pack(
+                    PEAKS_MAGIC, PEAKS_VERSION, int(self.sample_rate), int(self.frames),
+                    self.samples_per_peak, self.factor, len(levels)
+                ))
+                for level in levels:
+                    handle.write(PEAKS_LEVEL.pack(len(level)))
+                for level in levels:
+                    handle.write(level.tobytes())
+            os.replace(staging, path)
+        except BaseException:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+
+
+def build_peaks(audio_path: str, output_path: Optional[str] = None) -> Optional[str]:
+    """
+    Decode an audio file once and write its peak pyramid
+
+    Args:
+        audio_path: Audio file to analyse
+        output_path: Peak file to write (defaults to peaks_path(audio_path))
+
+    Returns:
+        Path of the peak file, or None if the audio could not be read
+    """
+    info = probe_audio(audio_path)
+    if not info:
+        return None
+
+    sample_rate = info['sample_rate']
+    builder = WaveformBuilder(sample_rate)
+    block = int(DECODE_BLOCK_SECONDS * sample_rate)
+
+    decoder = PcmDecoder(audio_path, sample_rate, info['channels'])
+    try:
+        while True:
+            samples = decoder.read(block)
+            builder.process(samples)
+            if len(samples) < block:
+                break
+    finally:
+        decoder.close()
+
+    if decoder.failed:
+        return None
+    output_path = output_path or peaks_path(audio_path)
+    builder.write(output_path)
+    return output_path
+
+
+def read_peaks(path: str,
+               start: float = 0.0,
+               end: Optional[float] = None,
+               samples_per_pixel: Optional[int] = None,
+               level: Optional[int] = None) -> Dict:
+    """
+    Read the peaks covering a time range at one zoom level
+
+    Only the requested slice of the level is read from disk.
+
+    Args:
+        path: Peak file
+        start: Range start in seconds
+        end: Range end in seconds (defaults to the end of the audio)
+        samples_per_pixel: Pick the coarsest level that still has a peak
+            for every this many frames
+        level: Explicit level index (overrides samples_per_pixel)
+
+    Returns:
+        Dictionary with the level's resolution, the first peak's start time
+        and peaks as an int8 (count, 2) min/max array scaled to +/-127
+    """
+    with open(path, 'rb') as handle:
+        magic, version, sample_rate, frames, base, factor, level_count = PEAKS_HEADER.unpack(
+            handle.read(PEAKS_HEADER.size)
+        )
+        if magic != PEAKS_MAGIC or version != PEAKS_VERSION:
+            raise ValueError(f"Not a version {PEAKS_VERSION} peak file: {path}")
+
+        counts = [PEAKS_LEVEL.unpack(handle.read(PEAKS_LEVEL.size))[0] for _ in range(level_count)]
+
+        if level is None:
+            level = 0
+            if samples_per_pixel:
+                while level + 1 < level_count and base * factor ** (level + 1) <= samples_per_pixel:
+                    level += 1
+        level = max(0, min(int(level), level_count - 1))
+        per_peak = base * factor ** level
+
+        first = max(0, min(int(start * sample_rate) // per_peak, counts[level]))
+        last = counts[level] if end is None else -(-int(end * sample_rate) // per_peak)
+        last = max(first, min(last, counts[level]))
+
+        offset = PEAKS_HEADER.size + PEAKS_LEVEL.size * level_count + 2 * (sum(counts[:level]) + first)
+        handle.seek(offset)
+        peaks = np.frombuffer(handle.read(2 * (last - first)), dtype=np.int8).reshape(-1, 2)
+
+    return {
+        'sample_rate': sample_rate,
+        'duration': frames / sample_rate if sample_rate else 0.0,
+        'level': level,
+        'levels': level_count,
+        'samples_per_peak': per_peak,
+        'start': first * per_peak / sample_rate if sample_rate else 0.0,
+        'peaks': peaks
+    }
@@ -248,6 +248,8 @@ class Episode(Base, TimestampMixin):
     # Processing results
     duration = Column(Integer)  # Duration in seconds
     file_size_bytes = Column(BigInteger)
+    renditions = Column(JSON, default=list)  # Rendered files, written only by the render task
+    chapters = Column(JSON, default=list)  # Chapter markers of the rendered files
     
     # Relationships
     podcast = relationship("Podcast", back_populates="episodes")
@@ -301,6 +303,8 @@ class Episode(Base, TimestampMixin):
             'duration': self.duration,
             'duration_formatted': self.duration_formatted,
             'file_size_bytes': self.file_size_bytes,
+            'renditions': self.renditions or [],
+            'chapters': self.chapters or [],
             'published_at': self.published_at.isoformat() if self.published_at else None,
             'scheduled_publish_at': self.scheduled_publish_at.isoformat() if self.scheduled_publish_at else None,
             'created_at': self.created_at.isoformat(),
@@ -0,0 +1,10 @@
+"""
+Test configuration
+Puts the source tree on the Python path, as the benchmarks do
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
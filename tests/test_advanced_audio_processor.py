@@ -0,0 +1,130 @@
+"""
+Advanced Audio Processor Tests
+Fades applied to AudioSegments, and the processed-segment cache
+"""
+
+import shutil
+
+import numpy as np
+import pytest
+import soundfile as sf
+from pydub import AudioSegment
+
+from core.advanced_audio_processor import AdvancedAudioProcessor
+from core.fades import fade_curve
+from core.pcm_cache import PcmCache
+
+needs_ffmpeg = pytest.mark.skipif(not shutil.which(AudioSegment.converter), reason='ffmpeg not installed')
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return AdvancedAudioProcessor(output_dir=str(tmp_path / 'outputs'))
+
+
+def make_segment(frames: int, sample_rate: int = 1000) -> AudioSegment:
+    """Stereo int16 noise"""
+    rng = np.random.default_rng(1)
+    pcm = rng.integers(-20000, 20000, size=(frames, 2), dtype=np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=sample_rate, channels=2)
+
+
+def pcm_of(segment: AudioSegment) -> np.ndarray:
+    return np.frombuffer(segment.raw_data, dtype=np.int16).reshape(-1, segment.channels)
+
+
+def test_fade_leaves_unfaded_frames_untouched(processor):
+    segment = make_segment(5000)
+
+    faded = processor.apply_fade(segment, fade_in_duration=0.5, fade_out_duration=1.0)
+
+    before, after = pcm_of(segment), pcm_of(faded)
+    assert len(after) == len(before)
+    assert np.array_equal(after[500:4000], before[500:4000])
+    assert not np.array_equal(after[:500], before[:500])
+    assert not np.array_equal(after[4000:], before[4000:])
+
+
+def test_fade_in_follows_curve(processor):
+    segment = make_segment(1000)
+
+    faded = processor.apply_fade(segment, fade_in_duration=0.4, fade_type='equal_power')
+
+    expected = np.rint(pcm_of(segment)[:400] * fade_curve('equal_power', 400)[:, np.newaxis].astype(np.float64))
+    assert np.array_equal(pcm_of(faded)[:400], expected)
+
+
+def test_overlapping_fades_cover_short_segment(processor):
+    segment = make_segment(100)
+
+    faded = processor.apply_fade(segment, fade_in_duration=1.0, fade_out_duration=1.0)
+
+    assert len(faded) == len(segment)
+    assert np.all(pcm_of(faded)[0] == 0)
+    assert np.all(np.abs(pcm_of(faded)) <= np.abs(pcm_of(segment)))
+
+
+class RecordingCache(PcmCache):
+    """PcmCache that records the segment keys it is asked for and given"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.misses = []
+        self.stored = []
+
+    def get_segment(self, key, channels):
+        samples = super().get_segment(key, channels)
+        if samples is None:
+            self.misses.append(key)
+        return samples
+
+    def put_segment(self, key, samples):
+        self.stored.append(key)
+        super().put_segment(key, samples)
+
+
+@needs_ffmpeg
+def test_rerender_reprocesses_only_changed_segment(tmp_path):
+    sample_rate = 44100
+    rng = np.random.default_rng(2)
+    segments = []
+    for index, (segment_type, seconds) in enumerate([('intro', 2), ('main', 20), ('outro', 3)]):
+        path = str(tmp_path / f'{segment_type}.wav')
+        sf.write(path, (rng.standard_normal((seconds * sample_rate, 2)) * 0.1).astype(np.float32), sample_rate)
+        segments.append({'audio_file': path, 'type': segment_type, 'fade': {'fade_in': 0.5, 'fade_out': 0.5}})
+
+    cache = RecordingCache(str(tmp_path / 'cache'))
+    processor = AdvancedAudioProcessor(output_dir=str(tmp_path / 'outputs'), pcm_cache=cache)
+    first = processor.process_template_segments(segments, None, 'episode.wav')
+    assert first['success'] and first['segments_cached'] == 0
+
+    # Only the main recording's fade changes
+    segments[1] = {**segments[1], 'fade': {'fade_in': 1.0, 'fade_out': 0.5}}
+    cache.misses.clear()
+    cache.stored.clear()
+    second = processor.process_template_segments(segments, None, 'episode.wav')
+
+    changed = processor.get_segment_cache_key(segments[1], sample_rate, 2)
+    assert second['success'] and second['segments_cached'] == 2
+    assert cache.misses == [changed]
+    assert cache.stored == [changed]
+
+
+@needs_ffmpeg
+@pytest.mark.parametrize('streaming', [False, True])
+def test_silent_segment_gets_no_chapter(tmp_path, streaming):
+    sample_rate = 16000
+    tone = 0.3 * np.sin(2 * np.pi * 440 * np.arange(2 * sample_rate) / sample_rate)
+    sf.write(str(tmp_path / 'speech.wav'), tone.astype(np.float32), sample_rate)
+    sf.write(str(tmp_path / 'silence.wav'), np.zeros(2 * sample_rate, dtype=np.float32), sample_rate)
+    segments = [
+        {'audio_file': str(tmp_path / 'speech.wav'), 'type': 'intro', 'trim_silence': True},
+        {'audio_file': str(tmp_path / 'silence.wav'), 'type': 'main', 'trim_silence': True},
+        {'audio_file': str(tmp_path / 'speech.wav'), 'type': 'outro', 'trim_silence': True}
+    ]
+
+    processor = AdvancedAudioProcessor(output_dir=str(tmp_path / 'outputs'), streaming=streaming)
+    result = processor.process_template_segments(segments, None, 'episode.wav')
+
+    assert result['success']
+    assert [chapter['title'] for chapter in result['chapters']] == ['Intro', 'Outro']
@@ -0,0 +1,39 @@
+"""
+Audio Mixer Tests
+Conversions between integer PCM and float32 samples
+"""
+
+import numpy as np
+from pydub import AudioSegment
+
+from core.audio_mixer import samples_to_segment, segment_to_samples
+
+
+def make_segment(pcm: np.ndarray, sample_rate: int = 44100) -> AudioSegment:
+    """AudioSegment holding (frames, channels) int16 PCM"""
+    return AudioSegment(
+        data=pcm.astype('<i2').tobytes(),
+        sample_width=2,
+        frame_rate=sample_rate,
+        channels=pcm.shape[1]
+    )
+
+
+def test_int16_round_trip_is_bit_exact():
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-32768, 32768, size=(48000, 2), dtype=np.int16)
+    # Full-scale extremes and values around zero included
+    pcm[:6, 0] = [-32768, 32767, -1, 0, 1, -32767]
+    segment = make_segment(pcm)
+
+    restored = samples_to_segment(segment_to_samples(segment), segment.frame_rate)
+
+    assert restored.raw_data == segment.raw_data
+
+
+def test_samples_beyond_full_scale_are_clipped():
+    samples = np.array([[1.5], [1.0], [-1.0], [-1.5]], dtype=np.float32)
+
+    pcm = np.frombuffer(samples_to_segment(samples, 8000).raw_data, dtype='<i2')
+
+    assert pcm.tolist() == [32767, 32767, -32768, -32768]
@@ -0,0 +1,73 @@
+"""
+Encoder Pool Tests
+Staging files left by failed encodes and dead workers
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+from pydub import AudioSegment
+
+from core.audio_stream import PcmEncoder, staging_prefix
+from core.encoder_pool import STALE_STAGING_SECONDS, EncoderPool, sweep_staging
+
+needs_ffmpeg = pytest.mark.skipif(not shutil.which(AudioSegment.converter), reason='ffmpeg not installed')
+
+
+def dead_pid() -> int:
+    """Id of a process that has exited"""
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def touch(path, age: float = 0.0) -> None:
+    with open(path, 'wb'):
+        pass
+    if age:
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+
+def test_sweep_removes_only_dead_workers_files(tmp_path):
+    host = socket.gethostname().replace('_', '-')
+    dead = tmp_path / f'.encode_{host}_{dead_pid()}_abc.mp3'
+    alive = tmp_path / f'{staging_prefix()}abc.mp3'
+    other_host = tmp_path / f'.encode_otherhost_{dead_pid()}_abc.mp3'
+    legacy_old = tmp_path / '.encode_abc.mp3'
+    legacy_new = tmp_path / '.encode_def.mp3'
+    output = tmp_path / 'episode.mp3'
+    for path in (dead, alive, other_host, legacy_new, output):
+        touch(path)
+    touch(legacy_old, age=STALE_STAGING_SECONDS + 60)
+
+    assert sweep_staging(str(tmp_path)) == 2
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        path.name for path in (alive, other_host, legacy_new, output)
+    )
+
+
+def test_pool_sweeps_its_work_dir(tmp_path):
+    host = socket.gethostname().replace('_', '-')
+    touch(tmp_path / f'.encode_{host}_{dead_pid()}_abc.mp3')
+
+    pool = EncoderPool(size=0, work_dir=str(tmp_path))
+    pool.close()
+
+    assert os.listdir(tmp_path) == []
+
+
+@needs_ffmpeg
+def test_failed_encode_removes_staging_file(tmp_path):
+    encoder = PcmEncoder(None, 44100, 2, format='mp3', codec='no_such_codec', work_dir=str(tmp_path))
+    encoder.attach(str(tmp_path / 'episode.mp3'))
+
+    with pytest.raises(RuntimeError):
+        encoder.close()
+
+    assert os.listdir(tmp_path) == []
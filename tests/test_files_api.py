@@ -0,0 +1,86 @@
+"""
+Files API Tests
+Waveform peaks of uploaded audio
+"""
+
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+flask = pytest.importorskip('flask')
+flask_jwt_extended = pytest.importorskip('flask_jwt_extended')
+pytest.importorskip('sqlalchemy')
+
+import database  # noqa: E402
+from api.files import files_bp  # noqa: E402
+from core.waveform import WaveformBuilder, peaks_path  # noqa: E402
+from database import get_db_session, init_database  # noqa: E402
+from database.models_dev import UserFile  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = flask.Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'JWT_SECRET_KEY': 'test-secret',
+        'DATABASE_URL': 'sqlite://',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads')
+    })
+    flask_jwt_extended.JWTManager(app)
+    init_database(app)
+    app.register_blueprint(files_bp, url_prefix='/api/v1/files')
+    yield app
+    database.SessionLocal.remove()
+
+
+def auth_header(app, user_id: str) -> dict:
+    with app.app_context():
+        token = flask_jwt_extended.create_access_token(identity=user_id)
+    return {'Authorization': f'Bearer {token}'}
+
+
+def add_upload(app, user_id: str) -> str:
+    """Store an audio upload as UserFile does, with its peaks already built"""
+    relative_path = os.path.join(user_id, 'recording.wav')
+    audio_path = os.path.join(app.config['UPLOAD_FOLDER'], relative_path)
+    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+    with open(audio_path, 'wb') as handle:
+        handle.write(b'\0' * 44)
+
+    builder = WaveformBuilder(8000)
+    builder.process(np.sin(np.linspace(0, 200, 16000, dtype=np.float32)))
+    builder.write(peaks_path(audio_path))
+
+    db = get_db_session()
+    user_file = UserFile(
+        user_id=user_id,
+        original_filename='recording.wav',
+        stored_filename='recording.wav',
+        file_path=relative_path,
+        file_type='audio',
+        file_size=44
+    )
+    db.add(user_file)
+    db.commit()
+    return user_file.id
+
+
+def test_peaks_of_user_file_upload(app):
+    user_id = str(uuid.uuid4())
+    file_id = add_upload(app, user_id)
+
+    response = app.test_client().get(f'/api/v1/files/{file_id}/peaks', headers=auth_header(app, user_id))
+
+    assert response.status_code == 200
+    assert len(response.get_json()['peaks']) > 0
+
+
+def test_peaks_of_another_users_upload_are_not_found(app):
+    file_id = add_upload(app, str(uuid.uuid4()))
+
+    response = app.test_client().get(f'/api/v1/files/{file_id}/peaks', headers=auth_header(app, str(uuid.uuid4())))
+
+    assert response.status_code == 404